@@ -0,0 +1,268 @@
+import threading
+import time
+
+from metrics import Metrics
+from parsers import loads
+
+SAMBANOVA_CHAT_URL = "https://api.sambanova.ai/v1/chat/completions"
+
+
+class RequestCancelled(Exception):
+    """A request abandoned because the job was stopped ("stopped") or ran out of time after being sent ("deadline")"""
+
+    def __init__(self, message, reason="stopped"):
+        super().__init__(message)
+        self.reason = reason
+
+
+class ApiClient:
+    """Chat-completions client with one pooled keep-alive session per API key.
+
+    Requests go through the rate limiter, which picks the key, and are retried
+    with exponential backoff. With http2=True an httpx client is used when
+    httpx (with the h2 extra) is installed. With stream=True completions are
+    read as server-sent events, so the text can be used while it is generated
+    and a request can be abandoned between two tokens.
+    """
+
+    def __init__(self, api_keys, rate_limiter, url=SAMBANOVA_CHAT_URL, pool_size=10,
+                 timeout=30, max_retries=3, http2=False, log=None, metrics=None, name="sambanova",
+                 stream=False):
+        self.name = name
+        self.api_keys = api_keys
+        self.rate_limiter = rate_limiter
+        self.url = url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.http2 = http2
+        self.stream = stream
+        self.log = log or (lambda message: None)
+        self.metrics = metrics or Metrics()
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def set_pool_size(self, pool_size):
+        """Match the connection pool to the number of request workers"""
+        with self.lock:
+            if pool_size == self.pool_size:
+                return
+            self.pool_size = pool_size
+            sessions, self.sessions = self.sessions, {}
+        for session in sessions.values():
+            session.close()
+
+    def session(self, key_index):
+        with self.lock:
+            session = self.sessions.get(key_index)
+            if session is None:
+                session = self.create_session(self.api_keys[key_index])
+                self.sessions[key_index] = session
+            return session
+
+    def create_session(self, api_key):
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream" if self.stream else "application/json"
+        }
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        if self.http2:
+            try:
+                import httpx
+                return httpx.Client(
+                    http2=True,
+                    headers=headers,
+                    timeout=self.timeout,
+                    limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+                )
+            except ImportError:
+                self.log("HTTP/2 requested but httpx[http2] is not installed, using HTTP/1.1 keep-alive")
+                self.http2 = False
+
+        # Imported with the first session, so starting the application does not load it
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def post(self, key_index, payload, timeout=None):
+        session = self.session(key_index)
+        timeout = timeout or self.timeout
+        if not self.stream:
+            return session.post(self.url, json=payload, timeout=timeout)
+        if not hasattr(session, "build_request"):  # requests; httpx clients have build_request
+            return session.post(self.url, json=payload, timeout=timeout, stream=True)
+        return session.send(session.build_request("POST", self.url, json=payload, timeout=timeout), stream=True)
+
+    def read_stream(self, response, on_text=None, cancel=None, deadline=None, started=None):
+        """Collect a server-sent events completion, passing each piece of text on as it arrives.
+
+        Returns (text, usage, finish_reason). The finish reason is "deadline" when
+        the chunk ran out of time and "interrupted" when the connection broke
+        after some text was already handed to on_text.
+        """
+        parts = []
+        usage = {}
+        finish_reason = None
+        started = started or time.monotonic()
+        try:
+            for line in response.iter_lines():
+                if cancel is not None and cancel.is_set():
+                    raise RequestCancelled("Request cancelled, the job was stopped")
+                if deadline is not None and time.monotonic() > deadline:
+                    finish_reason = "deadline"
+                    break
+                if isinstance(line, bytes):
+                    line = line.decode("utf-8")
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                event = loads(data)
+                if event.get("error"):
+                    raise Exception(event["error"].get("message", "Error in response stream"))
+                usage = event.get("usage") or usage
+                for choice in event.get("choices") or []:
+                    text = (choice.get("delta") or {}).get("content")
+                    if text:
+                        if not parts:
+                            self.metrics.observe("first_token", time.monotonic() - started, backend=self.name)
+                        parts.append(text)
+                        if on_text is not None:
+                            on_text(text)
+                    finish_reason = choice.get("finish_reason") or finish_reason
+        except RequestCancelled:
+            raise
+        except Exception:
+            # Text already handed on cannot be taken back, so keep it instead of asking again
+            if not (parts and on_text is not None):
+                raise
+            finish_reason = "interrupted"
+        finally:
+            response.close()
+        return "".join(parts), usage, finish_reason
+
+    def complete(self, payload, label="request", on_text=None, cancel=None, time_limit=None):
+        """Send a chat-completions payload and return the parsed response body.
+
+        Rate-limited requests are retried on another key without counting as an
+        attempt. Other failures are retried up to max_retries times. When streaming,
+        on_text receives the text as it is generated; `cancel` (a threading.Event)
+        abandons the request early, and the answer is cut off `time_limit`
+        seconds after it was sent (a non-streamed one by the request timeout).
+        Time spent waiting for a key does not count, but that wait gives up
+        after `time_limit` seconds as well.
+        """
+        estimated_tokens = self.rate_limiter.estimate_tokens(payload["messages"], payload.get("max_tokens", 0))
+        if self.stream:
+            payload = dict(payload, stream=True, stream_options={"include_usage": True})
+        retry_count = 0
+        key_deadline = time.monotonic() + time_limit if time_limit else None
+
+        while True:
+            if cancel is not None and cancel.is_set():
+                raise RequestCancelled(f"{label} cancelled, the job was stopped")
+            # Wait for a key with remaining quota instead of sleeping a fixed time
+            with self.metrics.time("rate_limit_wait"):
+                key_index = self.rate_limiter.acquire(estimated_tokens, cancel, key_deadline)
+            if key_index is None:
+                if cancel is not None and cancel.is_set():
+                    raise RequestCancelled(f"{label} cancelled, the job was stopped")
+                raise RequestCancelled(f"{label} ran out of time waiting for an API key", reason="deadline")
+            try:
+                self.log(f"Sending {label} to API (Attempt {retry_count + 1}/{self.max_retries}, API Key #{key_index + 1})")
+                sent = time.monotonic()
+                deadline = sent + time_limit if time_limit else None
+                with self.metrics.time("network", backend=self.name, key=key_index + 1):
+                    response = self.post(key_index, payload, min(self.timeout, time_limit) if time_limit else None)
+                    if response.status_code == 200 and self.stream:
+                        text, usage, finish_reason = self.read_stream(response, on_text, cancel, deadline, sent)
+            except RequestCancelled:
+                self.rate_limiter.release(key_index)
+                raise
+            except Exception as e:
+                self.rate_limiter.release(key_index)
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise RequestCancelled(f"{label} ran out of time", reason="deadline")
+                retry_count += 1
+                self.handle_error(e, label, retry_count, cancel)
+                continue
+
+            if response.status_code == 429:  # Rate limit exceeded
+                response.close()
+                cooldown = self.rate_limiter.report_rate_limited(key_index, response.headers)
+                self.metrics.incr("rate_limited", backend=self.name, key=key_index + 1)
+                self.log(f"Rate limit reached on {self.name} API Key #{key_index + 1}, pausing it for {cooldown:.1f}s")
+                continue  # Retry on another key without incrementing retry count
+
+            try:
+                if response.status_code != 200:
+                    if hasattr(response, "read"):
+                        response.read()  # httpx streams must be read before .json()
+                    error_data = response.json()
+                    error_msg = error_data.get('error', {}).get('message', 'Unknown error')
+                    raise Exception(f"API request failed with status {response.status_code}: {error_msg}")
+
+                if self.stream:
+                    if not text and finish_reason == "deadline":
+                        self.rate_limiter.release(key_index)
+                        raise RequestCancelled(f"{label} ran out of time", reason="deadline")
+                    response_data = {
+                        "choices": [{"message": {"role": "assistant", "content": text}, "finish_reason": finish_reason}],
+                        "usage": usage
+                    }
+                else:
+                    response_data = response.json()
+                if not response_data.get("choices") or not response_data["choices"][0].get("message", {}).get("content"):
+                    raise Exception("Empty response from API")
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                self.rate_limiter.release(key_index)
+                retry_count += 1
+                self.handle_error(e, label, retry_count, cancel)
+                continue
+
+            if self.stream and finish_reason in ("deadline", "interrupted"):
+                self.metrics.incr("streams_cut", backend=self.name, reason=finish_reason)
+
+            usage = response_data.get("usage") or {}
+            self.rate_limiter.report_success(
+                key_index,
+                response.headers,
+                estimated_tokens=estimated_tokens,
+                used_tokens=usage.get("total_tokens")
+            )
+            self.metrics.incr("requests", backend=self.name, key=key_index + 1)
+            self.metrics.incr("tokens_in", usage.get("prompt_tokens", 0))
+            self.metrics.incr("tokens_out", usage.get("completion_tokens", 0))
+            return response_data
+
+    def handle_error(self, error, label, retry_count, cancel=None):
+        """Log a failed attempt and back off, or give up after the last retry"""
+        self.log(f"Error processing {label} (Attempt {retry_count}/{self.max_retries}): {str(error)}")
+
+        if retry_count >= self.max_retries:
+            raise Exception(f"Failed to convert {label} after {self.max_retries} attempts. Last error: {str(error)}")
+
+        delay = self.rate_limiter.backoff_delay(retry_count)
+        self.log(f"Retrying {label} in {delay:.1f}s")
+        self.metrics.incr("retries")
+        with self.metrics.time("backoff"):
+            if cancel is None:
+                time.sleep(delay)
+            # Waiting on the stop event lets a stopped job end without sitting out the backoff
+            elif cancel.wait(delay):
+                raise RequestCancelled(f"{label} cancelled, the job was stopped")
+
+    def close(self):
+        with self.lock:
+            sessions, self.sessions = self.sessions, {}
+        for session in sessions.values():
+            session.close()
@@ -0,0 +1,203 @@
+import os
+import threading
+import time
+
+from api_client import ApiClient, RequestCancelled
+from metrics import Metrics
+from rate_limiter import RateLimiter
+
+SAMBANOVA_BASE_URL = "https://api.sambanova.ai/v1"
+SAMBANOVA_MODEL = "Meta-Llama-3.1-8B-Instruct"
+
+
+def load_keys(prefix):
+    """Read `{prefix}_API_KEY` and `{prefix}_API_KEY_1` .. `_5` from the environment"""
+    keys = [os.getenv(f"{prefix}_API_KEY")] + [os.getenv(f"{prefix}_API_KEY_{i}") for i in range(1, 6)]
+    return [key for key in keys if key]
+
+
+def load_backend_configs(api_keys=None):
+    """Backends listed in BACKENDS (default: SAMBANOVA, plus OPENAI when OPENAI_BASE_URL is set).
+
+    Each NAME is configured with NAME_BASE_URL, NAME_MODEL, NAME_API_KEY or
+    NAME_API_KEY_1..5, NAME_REQUESTS_PER_MINUTE and NAME_TOKENS_PER_MINUTE.
+    SambaNova defaults to its public endpoint; other backends (vLLM, llama.cpp,
+    the mock server) need a base URL and may run without keys or quotas.
+    """
+    default = "SAMBANOVA,OPENAI" if os.getenv("OPENAI_BASE_URL") else "SAMBANOVA"
+    names = [name.strip().upper() for name in os.getenv("BACKENDS", default).split(",") if name.strip()]
+
+    configs = []
+    for name in names:
+        sambanova = name == "SAMBANOVA"
+        base_url = os.getenv(f"{name}_BASE_URL", SAMBANOVA_BASE_URL if sambanova else "")
+        keys = api_keys if sambanova and api_keys is not None else load_keys(name)
+        if not base_url or (sambanova and not keys):
+            continue
+        configs.append({
+            "name": name.lower(),
+            "url": base_url.rstrip("/") + "/chat/completions",
+            "model": os.getenv(f"{name}_MODEL", SAMBANOVA_MODEL if sambanova else "default"),
+            # Local servers usually take no key at all
+            "api_keys": keys or [""],
+            # SambaNova keeps the older RATE_LIMIT_* settings, other backends are unlimited by default
+            "requests_per_minute": int(os.getenv(
+                f"{name}_REQUESTS_PER_MINUTE",
+                os.getenv("RATE_LIMIT_REQUESTS_PER_MINUTE", 30) if sambanova else 0
+            )),
+            "tokens_per_minute": int(os.getenv(
+                f"{name}_TOKENS_PER_MINUTE",
+                os.getenv("RATE_LIMIT_TOKENS_PER_MINUTE", 100000) if sambanova else 0
+            ))
+        })
+    return configs
+
+
+class Backend:
+    """One chat-completions provider: its endpoint, model, keys, quotas and connection pool"""
+
+    def __init__(self, name, url, api_keys, model, requests_per_minute=30, tokens_per_minute=100000,
+                 pool_size=10, timeout=30, http2=False, stream=False, log=None, metrics=None):
+        self.name = name
+        self.model = model
+        self.api_keys = api_keys
+        self.rate_limiter = RateLimiter(len(api_keys), requests_per_minute, tokens_per_minute)
+        self.client = ApiClient(
+            api_keys, self.rate_limiter, url=url, pool_size=pool_size, timeout=timeout,
+            http2=http2, log=log, metrics=metrics, name=name, stream=stream
+        )
+        self.latency = None
+        self.in_flight = 0
+        self.failures = 0
+        self.degraded_until = 0.0
+        self.lock = threading.Lock()
+
+    def score(self, estimated_tokens, default_latency=5.0):
+        """Expected seconds until a request sent now completes (lower is better)"""
+        with self.lock:
+            latency = default_latency if self.latency is None else self.latency
+            load = 1 + self.in_flight / max(1, 2 * len(self.api_keys))
+        return latency * load + self.rate_limiter.wait_time(estimated_tokens)
+
+    def is_degraded(self):
+        return self.degraded_until > time.monotonic()
+
+    def complete(self, payload, label="request", on_text=None, cancel=None, time_limit=None):
+        payload = dict(payload, model=self.model)
+        with self.lock:
+            self.in_flight += 1
+        started = time.monotonic()
+        try:
+            response_data = self.client.complete(
+                payload, label=f"{label} via {self.name}", on_text=on_text, cancel=cancel, time_limit=time_limit
+            )
+        except RequestCancelled:
+            # Not the backend's fault, so it is not marked degraded
+            with self.lock:
+                self.in_flight -= 1
+            raise
+        except Exception:
+            with self.lock:
+                self.in_flight -= 1
+                self.failures += 1
+                # Stay away from a failing backend for a while, doubling each time it fails again
+                self.degraded_until = time.monotonic() + min(300.0, 15.0 * 2 ** (self.failures - 1))
+            raise
+        with self.lock:
+            self.in_flight -= 1
+            self.failures = 0
+            elapsed = time.monotonic() - started
+            # Exponentially weighted so the router reacts to a provider slowing down
+            self.latency = elapsed if self.latency is None else 0.8 * self.latency + 0.2 * elapsed
+        return response_data
+
+    def set_pool_size(self, pool_size):
+        self.client.set_pool_size(pool_size)
+
+    def close(self):
+        self.client.close()
+
+
+class BackendRouter:
+    """Sends each request to the backend with the best recent latency and free quota.
+
+    When a backend gives up on a request it is marked degraded and the
+    request fails over to the next best backend.
+    """
+
+    def __init__(self, backends, log=None, metrics=None):
+        self.backends = backends
+        self.log = log or (lambda message: None)
+        self.metrics = metrics or Metrics()
+
+    @property
+    def key_count(self):
+        return sum(len(backend.api_keys) for backend in self.backends)
+
+    def describe(self):
+        return ", ".join(f"{backend.name} ({len(backend.api_keys)} keys, {backend.model})" for backend in self.backends)
+
+    def ranked(self, estimated_tokens):
+        # Degraded backends are only used once every healthy one has been tried
+        return sorted(self.backends, key=lambda backend: (backend.is_degraded(), backend.score(estimated_tokens)))
+
+    def cached(self, payload, cache):
+        """Cached answer to a payload given by the model of any backend, best ranked backend first.
+
+        Responses are cached under the model of the backend that served them
+        (see the "backend_model" that complete() adds to each response).
+        """
+        estimated_tokens = RateLimiter.estimate_tokens(payload["messages"], payload.get("max_tokens", 0))
+        return cache.get_first([cache.make_key(dict(payload, model=backend.model))
+                                for backend in self.ranked(estimated_tokens)])
+
+    def complete(self, payload, label="request", on_text=None, cancel=None, time_limit=None, cache=None):
+        """Send a payload to the best backend, failing over to the next ones.
+
+        With a response cache, an answer cached for any backend's model is
+        returned instead, marked "cached". A fresh response names the model
+        that gave it as "backend_model", for the caller to cache it under once
+        it is validated.
+        """
+        if not self.backends:
+            raise Exception("No API backends configured")
+        if cache is not None:
+            cached = self.cached(payload, cache)
+            if cached is not None:
+                return {"choices": [{"message": {"role": "assistant", "content": cached}, "finish_reason": "stop"}],
+                        "cached": True}
+        estimated_tokens = RateLimiter.estimate_tokens(payload["messages"], payload.get("max_tokens", 0))
+        last_error = None
+        for backend in self.ranked(estimated_tokens):
+            if last_error is not None:
+                self.metrics.incr("failovers", backend=backend.name)
+                self.log(f"Failing over {label} to {backend.name}")
+            try:
+                response_data = backend.complete(payload, label, on_text=on_text, cancel=cancel, time_limit=time_limit)
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                last_error = e
+                self.log(f"Backend {backend.name} failed on {label}: {str(e)}")
+                continue
+            self.metrics.incr("routed", backend=backend.name)
+            response_data["backend_model"] = backend.model
+            return response_data
+        raise last_error
+
+    def set_pool_size(self, pool_size):
+        for backend in self.backends:
+            backend.set_pool_size(pool_size)
+
+    def close(self):
+        for backend in self.backends:
+            backend.close()
+
+
+def create_router(api_keys=None, pool_size=10, timeout=30, http2=False, stream=False, log=None, metrics=None):
+    """Build the router over every backend configured in the environment"""
+    backends = [
+        Backend(pool_size=pool_size, timeout=timeout, http2=http2, stream=stream, log=log, metrics=metrics, **config)
+        for config in load_backend_configs(api_keys)
+    ]
+    return BackendRouter(backends, log=log, metrics=metrics)
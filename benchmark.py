@@ -0,0 +1,188 @@
+"""End-to-end throughput benchmark against the local mock server.
+
+    python benchmark.py --scale 1 --latency 0.2 --json-output logs/benchmark.json
+
+Fixtures (PDF, CSV, JSON and TXT files of several sizes) are generated in a
+temporary directory and converted into every output format, each run in a
+fresh process with an empty cache. Reports documents/s, chunks/s, p50/p99
+request latency and the peak RSS of the converter process.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import fitz  # PyMuPDF for better PDF handling
+
+from engine import FORMATS
+
+ROOT = Path(__file__).resolve().parent
+VOCABULARY = (
+    "data model training dataset record field value table column row page section report "
+    "analysis result method system process network request response format example summary "
+    "question answer context instruction output input value measure growth revenue quarter "
+    "customer product service market region policy contract clause term party agreement"
+).split()
+
+
+def sentence(rng, words=14):
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words)).capitalize() + "."
+
+
+def paragraph(rng, sentences=5):
+    return " ".join(sentence(rng) for _ in range(sentences))
+
+
+def write_fixtures(directory, scale=1, seed=0):
+    """Create PDF, CSV, JSON and TXT inputs, a small and a large one of each"""
+    rng = random.Random(seed)
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    files = []
+
+    for name, pages in (("small.pdf", 3), ("large.pdf", 40 * scale)):
+        doc = fitz.open()
+        for _ in range(pages):
+            page = doc.new_page()
+            page.insert_textbox(fitz.Rect(50, 50, 550, 800), "\n\n".join(paragraph(rng) for _ in range(4)), fontsize=9)
+        doc.save(str(directory / name))
+        doc.close()
+        files.append(directory / name)
+
+    for name, rows in (("small.csv", 100), ("large.csv", 5000 * scale)):
+        with open(directory / name, "w", encoding="utf-8") as f:
+            f.write("id,region,product,amount,note\n")
+            for i in range(rows):
+                f.write(f"{i},{rng.choice(VOCABULARY)},{rng.choice(VOCABULARY)},{rng.randint(1, 9999)},{sentence(rng, 8)}\n")
+        files.append(directory / name)
+
+    for name, items in (("small.json", 20), ("large.json", 500 * scale)):
+        records = [{"id": i, "title": sentence(rng, 5), "body": paragraph(rng, 2)} for i in range(items)]
+        (directory / name).write_text(json.dumps(records), encoding="utf-8")
+        files.append(directory / name)
+
+    for name, paragraphs in (("small.txt", 3), ("large.txt", 300 * scale)):
+        (directory / name).write_text("\n\n".join(paragraph(rng) for _ in range(paragraphs)), encoding="utf-8")
+        files.append(directory / name)
+
+    return files
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock_server(args):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, str(ROOT / "mock_server.py"), "--port", str(port), "--latency", str(args.latency),
+         "--jitter", str(args.jitter), "--rate-limit-rate", str(args.rate_limit_rate),
+         "--error-rate", str(args.error_rate), "--retry-after", str(args.retry_after)],
+        stdout=subprocess.PIPE, text=True
+    )
+    process.stdout.readline()  # Wait for the "listening" line
+    return process, f"http://127.0.0.1:{port}/v1"
+
+
+def run_format(format_name, files, base_url, work_dir, args):
+    """Convert every fixture into one format in a fresh converter process"""
+    work_dir.mkdir(parents=True, exist_ok=True)
+    metrics_file = work_dir / "metrics.jsonl"
+    env = dict(
+        os.environ,
+        BACKENDS="MOCK",
+        MOCK_BASE_URL=base_url,
+        MOCK_MODEL="mock-model",
+        MOCK_API_KEY="mock",
+        PYTHONPATH=str(ROOT)
+    )
+    if args.workers:
+        env["MAX_CONCURRENT_REQUESTS"] = str(args.workers)
+    command = [sys.executable, str(ROOT / "cli.py"), "convert", *map(str, files), "--format", format_name,
+               "--output", str(work_dir / "converted"), "--metrics-file", str(metrics_file)]
+
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=work_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # wait4 reports the resource usage of this run only, including its extraction processes
+    _, status, usage = os.wait4(process.pid, 0)
+    wall_seconds = time.perf_counter() - started
+
+    summary = {}
+    with open(metrics_file, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get("event") == "job_summary":
+                summary = record
+    network = summary.get("stages", {}).get("network", {})
+    return {
+        "format": format_name,
+        "exit_code": os.waitstatus_to_exitcode(status),
+        "documents": len(files),
+        "wall_seconds": round(wall_seconds, 2),
+        "documents_per_second": round(len(files) / wall_seconds, 3),
+        "chunks": summary.get("chunks", 0),
+        "chunks_per_second": summary.get("chunks_per_second", 0.0),
+        "requests": network.get("count", 0),
+        "p50_latency_seconds": network.get("p50_seconds", 0.0),
+        "p99_latency_seconds": network.get("p99_seconds", 0.0),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1)
+    }
+
+
+def print_table(results):
+    columns = [("format", 36), ("exit_code", 4), ("documents_per_second", 8), ("chunks", 7),
+               ("chunks_per_second", 8), ("requests", 8), ("p50_latency_seconds", 8),
+               ("p99_latency_seconds", 8), ("peak_rss_mb", 8)]
+    headers = ["format", "rc", "docs/s", "chunks", "chunks/s", "requests", "p50 s", "p99 s", "RSS MB"]
+    print("  ".join(header.ljust(width) for header, (_, width) in zip(headers, columns)))
+    for result in results:
+        print("  ".join(str(result[name]).ljust(width) for name, width in columns))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the conversion pipeline against the local mock server")
+    parser.add_argument("--formats", nargs="+", default=FORMATS, help="Formats to benchmark (default: all)")
+    parser.add_argument("--scale", type=int, default=1, help="Multiplier for the size of the large fixtures")
+    parser.add_argument("--workers", type=int, default=None, help="Concurrent requests (MAX_CONCURRENT_REQUESTS)")
+    parser.add_argument("--latency", type=float, default=0.2, help="Mean mock response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--json-output", default=None, help="Also write the results to this JSON file")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    server, base_url = start_mock_server(args)
+    results = []
+    try:
+        with tempfile.TemporaryDirectory(prefix="datagen-bench-") as temp_dir:
+            files = write_fixtures(Path(temp_dir) / "fixtures", scale=args.scale)
+            for index, format_name in enumerate(args.formats):
+                result = run_format(format_name, files, base_url, Path(temp_dir) / f"run_{index}", args)
+                results.append(result)
+                print(f"{format_name}: {result['chunks']:.0f} chunks in {result['wall_seconds']}s", file=sys.stderr)
+    finally:
+        server.terminate()
+        server.wait()
+
+    print_table(results)
+    if args.json_output:
+        Path(args.json_output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.json_output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return 1 if any(result["exit_code"] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
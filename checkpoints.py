@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+
+def chunk_hash(chunk):
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:16]
+
+
+class JobJournal:
+    """Append-only manifest of the chunks and parts finished for one job.
+
+    Every completed chunk and part is written as a JSON line and fsync'd, so
+    a job that crashes or is closed can be restarted from the first
+    incomplete chunk. The journal is removed once the job completes.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.chunks = {}
+        self.parts = {}
+        self.part_outputs = {}
+        self.load()
+
+    @classmethod
+    def for_file(cls, directory, file_path, target_format):
+        """Open the journal for converting `file_path` into `target_format`"""
+        stat = Path(file_path).stat()
+        identity = f"{Path(file_path).resolve()}|{stat.st_size}|{stat.st_mtime_ns}|{target_format}"
+        job_id = hashlib.sha256(identity.encode("utf-8")).hexdigest()[:16]
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        return cls(directory / f"{Path(file_path).stem}_{job_id}.jsonl")
+
+    def load(self):
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Last line may be cut short by a crash
+                if record.get("event") == "chunk":
+                    self.chunks.setdefault(record["part"], {})[record["index"]] = (record["hash"], record["output"])
+                elif record.get("event") == "part":
+                    self.parts[record["part"]] = record["output_path"]
+                elif record.get("event") == "part_output":
+                    self.part_outputs[record["part"]] = record["output_path"]
+        for part_key in self.parts:
+            self.chunks.pop(part_key, None)
+
+    def append(self, record):
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    @property
+    def has_progress(self):
+        return bool(self.chunks or self.parts)
+
+    def part(self, part_key):
+        return PartCheckpoint(self, part_key)
+
+    def is_part_done(self, part_key):
+        return part_key in self.parts
+
+    def part_output(self, part_key):
+        """Output file a part was being written to before the job stopped"""
+        return self.part_outputs.get(part_key)
+
+    def record_part_output(self, part_key, output_path):
+        self.part_outputs[part_key] = str(output_path)
+        self.append({"event": "part_output", "part": part_key, "output_path": str(output_path)})
+
+    def record_part(self, part_key, output_path):
+        self.parts[part_key] = str(output_path)
+        self.append({"event": "part", "part": part_key, "output_path": str(output_path)})
+        # Chunk outputs are no longer needed once the part has been saved
+        self.chunks.pop(part_key, None)
+
+    def finish(self):
+        """Remove the journal after the whole job succeeded"""
+        with self.lock:
+            if self.path.exists():
+                self.path.unlink()
+
+
+class PartCheckpoint:
+    """View of a journal restricted to the chunks of a single part"""
+
+    def __init__(self, journal, part_key):
+        self.journal = journal
+        self.part_key = part_key
+
+    def get(self, index, chunk):
+        """Return the saved output for a chunk, or None if it was not finished"""
+        saved = self.journal.chunks.get(self.part_key, {}).get(index)
+        if saved and saved[0] == chunk_hash(chunk):
+            return saved[1]
+        return None
+
+    def record(self, index, chunk, output):
+        digest = chunk_hash(chunk)
+        with self.journal.lock:
+            self.journal.chunks.setdefault(self.part_key, {})[index] = (digest, output)
+        self.journal.append({
+            "event": "chunk",
+            "part": self.part_key,
+            "index": index,
+            "hash": digest,
+            "output": output
+        })
@@ -0,0 +1,183 @@
+import re
+
+from extractors import iter_fixed_chunks
+
+PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n+|\f")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+# Boundaries tried in order when a paragraph does not fit, with the text used to glue the pieces back
+SPLITTERS = [
+    (SENTENCE_END, " "),
+    (re.compile(r"\n"), "\n"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def approximate_tokens(text):
+    """Fast token estimate (about four characters per token for English text)"""
+    return max(1, (len(text) + 3) // 4)
+
+
+def get_token_counter():
+    """Use tiktoken when it is installed, otherwise fall back to the approximation"""
+    try:
+        import tiktoken
+    except ImportError:
+        return approximate_tokens
+    encoding = tiktoken.get_encoding("cl100k_base")
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def iter_paragraphs(pieces, max_buffer_chars):
+    """Regroup a stream of text pieces into paragraphs (blank lines and page breaks end a paragraph)"""
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        parts = PARAGRAPH_BREAK.split(buffer)
+        # The last part may continue in the next piece
+        buffer = parts.pop()
+        for part in parts:
+            if part.strip():
+                yield part.strip()
+        if len(buffer) > max_buffer_chars:
+            # No paragraph break for a long time, cut at the last line break or space instead
+            cut = (buffer.rfind("\n", 0, max_buffer_chars) + 1
+                   or buffer.rfind(" ", 0, max_buffer_chars) + 1
+                   or max_buffer_chars)
+            if buffer[:cut].strip():
+                yield buffer[:cut].strip()
+            buffer = buffer[cut:]
+    if buffer.strip():
+        yield buffer.strip()
+
+
+def iter_table_chunks(blocks, max_tokens, count_tokens=approximate_tokens):
+    """Pack CSV rows into chunks that each start with the header and end on a row boundary"""
+    header = None
+    rows = []
+    used = 0
+    for block_header, block_rows in blocks:
+        header = block_header
+        header_tokens = count_tokens(header + "\n")
+        for row in block_rows:
+            tokens = count_tokens(row + "\n")
+            if rows and header_tokens + used + tokens > max_tokens:
+                yield "\n".join([header] + rows)
+                rows = []
+                used = 0
+            rows.append(row)
+            used += tokens
+    if rows:
+        yield "\n".join([header] + rows)
+
+
+class FixedSizeChunker:
+    """Slices content into fixed-size character chunks"""
+
+    def __init__(self, max_chunk_size=2000):
+        self.max_chunk_size = max_chunk_size
+
+    def chunk(self, pieces):
+        return iter_fixed_chunks(pieces, self.max_chunk_size)
+
+    def chunk_table(self, blocks):
+        return iter_table_chunks(blocks, self.max_chunk_size, len)
+
+
+class BoundaryChunker:
+    """Packs paragraphs, then sentences, into chunks of at most max_tokens.
+
+    Text is only split inside a sentence, line or word when that piece alone is
+    larger than the budget. With overlap_tokens set, each chunk starts with the
+    trailing sentences of the previous one, as many as fit next to its first new unit.
+    """
+
+    def __init__(self, max_tokens=1000, overlap_tokens=0, count_tokens=None):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = min(overlap_tokens, max_tokens // 2)
+        self.custom_counter = count_tokens is not None
+        self.count_tokens = count_tokens or get_token_counter()
+
+    def __getstate__(self):
+        # The default counter may be an unpicklable tokenizer, rebuild it in worker processes
+        state = self.__dict__.copy()
+        if not self.custom_counter:
+            del state["count_tokens"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if not self.custom_counter:
+            self.count_tokens = get_token_counter()
+
+    def chunk(self, pieces):
+        current = []  # (separator, text, tokens) tuples
+        current_tokens = 0
+        fresh = False  # Whether current holds anything beyond the overlap
+
+        for separator, text in self.iter_units(pieces):
+            # Count the separator too, so the joined chunk stays within budget
+            tokens = self.count_tokens(separator + text)
+            if fresh and current_tokens + tokens > self.max_tokens:
+                yield self.join(current)
+                current = self.overlap_tail(current)
+                current_tokens = sum(unit[2] for unit in current)
+                fresh = False
+            # The overlap only gets the room the next unit leaves, so chunks stay within max_tokens
+            while current and not fresh and current_tokens + tokens > self.max_tokens:
+                current_tokens -= current.pop(0)[2]
+            current.append((separator, text, tokens))
+            current_tokens += tokens
+            fresh = True
+
+        if fresh:
+            yield self.join(current)
+
+    def chunk_table(self, blocks):
+        """Row-aligned chunks of (header, rows) blocks, with the header repeated in each chunk"""
+        return iter_table_chunks(blocks, self.max_tokens, self.count_tokens)
+
+    def iter_units(self, pieces):
+        """Yield (separator, text) units that each fit in the token budget"""
+        max_buffer_chars = self.max_tokens * 64
+        for paragraph in iter_paragraphs(pieces, max_buffer_chars):
+            for index, (separator, unit) in enumerate(self.split_to_fit(paragraph, SPLITTERS)):
+                yield ("\n\n" if index == 0 else separator), unit
+
+    def split_to_fit(self, text, splitters):
+        """Split text into (separator, piece) pairs, using the coarsest boundary that makes each piece fit"""
+        if self.count_tokens(text) <= self.max_tokens:
+            return [("", text)]
+        if not splitters:
+            # Nothing left to split on, slice by characters
+            size = self.max_tokens * 4
+            return [("", text[i:i + size]) for i in range(0, len(text), size)]
+
+        (pattern, glue), rest = splitters[0], splitters[1:]
+        parts = [part.strip() for part in pattern.split(text) if part.strip()]
+        if len(parts) <= 1:
+            return self.split_to_fit(text, rest)
+
+        pieces = []
+        for part in parts:
+            for index, (separator, piece) in enumerate(self.split_to_fit(part, rest)):
+                pieces.append((separator if index else glue, piece))
+        return pieces
+
+    def overlap_tail(self, units):
+        if not self.overlap_tokens:
+            return []
+        tail = []
+        total = 0
+        for unit in reversed(units):
+            if total + unit[2] > self.overlap_tokens:
+                break
+            tail.insert(0, unit)
+            total += unit[2]
+        return tail
+
+    @staticmethod
+    def join(units):
+        text = units[0][1]
+        for separator, unit_text, _ in units[1:]:
+            text += separator + unit_text
+        return text
@@ -0,0 +1,173 @@
+import argparse
+import glob
+import json
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+
+from chunker import BoundaryChunker
+from engine import ConversionEngine, FORMATS
+from metrics import Metrics
+from shards import EXTENSIONS, compact_shards
+
+
+def resolve_format(name):
+    """Accept format names case-insensitively, with or without the ' Format' suffix"""
+    wanted = name.strip().lower()
+    for format_name in FORMATS:
+        if wanted in (format_name.lower(), format_name.lower().replace(" format", "")):
+            return format_name
+    raise argparse.ArgumentTypeError(f"unknown format '{name}' (choose from: {', '.join(FORMATS)})")
+
+
+def expand_inputs(patterns):
+    """Expand glob patterns ourselves so the CLI behaves the same on shells that do not"""
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        files.extend(str(Path(match)) for match in matches if Path(match).is_file())
+    return files
+
+
+class ConsoleReporter:
+    """Engine listener that streams progress to stdout as text or JSON lines"""
+
+    def __init__(self, json_logs=False, stream=None):
+        self.json_logs = json_logs
+        self.stream = stream or sys.stdout
+
+    def __call__(self, event, data):
+        if self.json_logs:
+            record = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "event": event}
+            record.update(data)
+            self.stream.write(json.dumps(record, default=str) + "\n")
+        elif event == "log":
+            self.stream.write(f"{time.strftime('%H:%M:%S')} - {data['message']}\n")
+        elif event == "progress":
+            self.stream.write(f"{time.strftime('%H:%M:%S')} - Progress: {data['value']:.0f}%\n")
+        elif event == "file_status":
+            self.stream.write(f"{time.strftime('%H:%M:%S')} - {Path(data['file_path']).name}: {data['status']}\n")
+        self.stream.flush()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="dataset_generator",
+        description="Convert documents into training datasets without the GUI"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert = subparsers.add_parser("convert", help="Convert input files into a dataset format")
+    convert.add_argument("inputs", nargs="+", help="Input files or glob patterns (PDF, TXT, CSV, JSON)")
+    convert.add_argument("-f", "--format", type=resolve_format, default=FORMATS[0],
+                         help=f"Output format (default: {FORMATS[0]})")
+    convert.add_argument("-o", "--output", default="converted_files",
+                         help="Directory for converted files (default: converted_files)")
+    convert.add_argument("-w", "--workers", type=int, default=None,
+                         help="Number of chunk requests kept in flight (default: 2 per API key)")
+    convert.add_argument("--ingest-workers", type=int, default=None,
+                         help="Files extracted and chunked in parallel processes (default: CPU count)")
+    convert.add_argument("--chunk-tokens", type=int, default=None,
+                         help="Token budget per chunk (default: CHUNK_MAX_TOKENS or 1000)")
+    convert.add_argument("--chunk-overlap", type=int, default=None,
+                         help="Tokens repeated from the previous chunk (default: CHUNK_OVERLAP_TOKENS or 0)")
+    convert.add_argument("--metrics-file", default=None,
+                         help="JSON lines file for stage timings and counters (default: logs/metrics.jsonl)")
+    convert.add_argument("--prometheus-file", default=None,
+                         help="Also write metrics in the Prometheus text format to this file")
+    convert.add_argument("--no-dedup", action="store_true",
+                         help="Keep duplicate and near-duplicate records (dedup is on unless DEDUP=0)")
+    convert.add_argument("--shards", action="store_true",
+                         help="Append records to compressed shards indexed by manifest.jsonl (or OUTPUT_MODE=shards)")
+    convert.add_argument("--shard-max-mb", type=float, default=None,
+                         help="Size at which a new shard is started (default: SHARD_MAX_MB or 256)")
+    convert.add_argument("--compression", choices=sorted(EXTENSIONS), default=None,
+                         help="Shard compression (default: SHARD_COMPRESSION or gzip)")
+    convert.add_argument("--priority", type=int, default=0,
+                         help="Queue priority of these files; higher priorities are converted first (default: 0)")
+    convert.add_argument("--max-in-flight", type=int, default=None,
+                         help="Requests each file may have in flight at once (default: JOB_MAX_IN_FLIGHT, or no cap)")
+    convert.add_argument("--json-logs", action="store_true", help="Emit progress as JSON lines")
+
+    compact = subparsers.add_parser("compact", help="Merge shard directories, dropping superseded and unfinished runs")
+    compact.add_argument("inputs", nargs="+", help="Shard directories (each with a manifest.jsonl)")
+    compact.add_argument("-o", "--output", default=None,
+                         help="Directory for the merged shards (default: the first input, compacted in place)")
+    compact.add_argument("--max-mb", type=float, default=256, help="Size at which a new shard is started (default: 256)")
+    compact.add_argument("--compression", choices=sorted(EXTENSIONS), default="gzip",
+                         help="Compression of the merged shards (default: gzip)")
+    return parser
+
+
+def run_convert(args):
+    files = expand_inputs(args.inputs)
+    if not files:
+        print("No input files found", file=sys.stderr)
+        return 2
+
+    chunker = None
+    if args.chunk_tokens is not None or args.chunk_overlap is not None:
+        chunker = BoundaryChunker(
+            max_tokens=args.chunk_tokens or int(os.getenv("CHUNK_MAX_TOKENS", 1000)),
+            overlap_tokens=args.chunk_overlap if args.chunk_overlap is not None else int(os.getenv("CHUNK_OVERLAP_TOKENS", 0))
+        )
+
+    metrics = None
+    if args.metrics_file or args.prometheus_file:
+        metrics = Metrics(
+            args.metrics_file or os.getenv("METRICS_FILE", "logs/metrics.jsonl"),
+            prometheus_path=args.prometheus_file or os.getenv("METRICS_PROMETHEUS_FILE") or None
+        )
+
+    engine = ConversionEngine(
+        converted_dir=args.output,
+        max_workers=args.workers,
+        chunker=chunker,
+        ingest_workers=args.ingest_workers,
+        metrics=metrics,
+        dedup=False if args.no_dedup else None,
+        output_mode="shards" if args.shards else None,
+        shard_max_mb=args.shard_max_mb,
+        shard_compression=args.compression
+    )
+    engine.add_listener(ConsoleReporter(json_logs=args.json_logs))
+
+    def stop(signum, frame):
+        # The first Ctrl+C stops the job cleanly, a second one exits at once
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        engine.stop()
+
+    previous_handler = signal.signal(signal.SIGINT, stop)
+    try:
+        results = engine.process_files(files, args.format, priority=args.priority, max_in_flight=args.max_in_flight)
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+
+    failed = [file_path for file_path, status in results.items() if status not in ("Completed", "Skipped")]
+    return 1 if failed else 0
+
+
+def run_compact(args):
+    missing = [directory for directory in args.inputs if not (Path(directory) / "manifest.jsonl").is_file()]
+    if missing:
+        print(f"No manifest.jsonl in: {', '.join(missing)}", file=sys.stderr)
+        return 2
+    output = args.output or args.inputs[0]
+    records = compact_shards(args.inputs, output, max_bytes=int(args.max_mb * 1024 * 1024), compression=args.compression)
+    print(f"Compacted {records} records from {len(args.inputs)} directories into {output}")
+    return 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "convert":
+        return run_convert(args)
+    if args.command == "compact":
+        return run_compact(args)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
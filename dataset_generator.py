@@ -1,32 +1,54 @@
+import sys
+
+if __name__ == "__main__" and len(sys.argv) > 1:
+    # Arguments mean a headless run, e.g. `python -m dataset_generator convert ...`;
+    # dispatch before Tk and the GUI modules are imported
+    from cli import main
+    sys.exit(main())
+
 import os
 import shutil
-import PyPDF2
-import json
-import csv
 from tkinter import *
 from tkinter import filedialog, messagebox, ttk
-from dotenv import load_dotenv
-import openai
-import uuid
 import threading
+import queue
+import logging
+from logging.handlers import RotatingFileHandler
 from pathlib import Path
-import fitz  # PyMuPDF for better PDF handling
-import pandas as pd
 import time
 import subprocess
-import requests
+from engine import ConversionEngine, FORMATS, format_file_size
+from plugins import input_extensions
+
+UI_TICK_MS = 100  # How often queued worker events are applied to the widgets
+UI_MAX_EVENTS_PER_TICK = 2000
+CONSOLE_MAX_LINES = 1000  # Older lines are dropped from the view, the full log is in LOG_FILE
+LOG_FILE = Path("logs") / "process.log"
 
-# Load environment variables
-load_dotenv()
+def create_file_logger():
+    """Logger that streams the full process log to a rotating file"""
+    LOG_FILE.parent.mkdir(exist_ok=True)
+    logger = logging.getLogger("dataset_generator")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        handler = RotatingFileHandler(LOG_FILE, maxBytes=5 * 1024 * 1024, backupCount=5, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    return logger
 
 class DatasetGenerator:
     def __init__(self):
-        self.api_keys = [
-            os.getenv(f"SAMBANOVA_API_KEY_{i}") 
-            for i in range(1, 6) 
-            if os.getenv(f"SAMBANOVA_API_KEY_{i}")
-        ]
-        self.current_key_index = 0
+        # The conversion pipeline itself runs headless; this class is only the UI
+        self.engine = ConversionEngine()
+        self.engine.add_listener(self.handle_engine_event)
+        # Worker threads only push events here, the Tk main loop applies them
+        self.ui_events = queue.SimpleQueue()
+        self.file_logger = create_file_logger()
+        # Converted file name -> Treeview item, so new outputs are added without a rescan
+        self.converted_items = {}
+        # Set while the engine works through the job queue on the worker thread
+        self.processing = False
         self.root = Tk()
         self.root.title("Dataset Generator Pro")
         self.root.geometry("1200x700")  # Wider window
@@ -40,12 +62,16 @@ class DatasetGenerator:
         self.style.configure('TLabelframe', padding=10)
         self.style.configure('TLabelframe.Label', font=('Helvetica', 10, 'bold'))
         
-        # Setup folders first
-        self.setup_folders()
+        # Folders are set up by the engine
+        self.remaining_dir = self.engine.remaining_dir
+        self.converted_dir = self.engine.converted_dir
         
         # Then create UI Components
         self.create_widgets()
         
+        # Start draining worker events on the main loop
+        self.root.after(UI_TICK_MS, self.drain_ui_events)
+        
     def create_widgets(self):
         # Main container with padding
         main_frame = ttk.Frame(self.root, padding=15)
@@ -79,6 +105,15 @@ class DatasetGenerator:
         )
         self.start_btn.pack(side=LEFT, padx=5)
         
+        self.stop_btn = ttk.Button(
+            button_frame,
+            text="⏹️ Stop",
+            command=self.stop_processing,
+            style='Accent.TButton',
+            state='disabled'
+        )
+        self.stop_btn.pack(side=LEFT, padx=5)
+        
         self.clear_btn = ttk.Button(
             button_frame,
             text="🗑️ Clear Files",
@@ -93,16 +128,7 @@ class DatasetGenerator:
         format_frame.pack(side=LEFT, fill=BOTH, padx=(5, 0))
         
         self.format_var = StringVar()
-        formats = [
-            "Alpaca Format",
-            "Prompt-Completion Format",
-            "Chat Format",
-            "Q/A Format",
-            "Instruction-Context-Response Format",
-            "JSONL",
-            "CSV",
-            "Table Format"
-        ]
+        formats = FORMATS
         self.format_dropdown = ttk.Combobox(
             format_frame,
             textvariable=self.format_var,
@@ -113,6 +139,34 @@ class DatasetGenerator:
         self.format_dropdown.set(formats[0])
         self.format_dropdown.pack(pady=5)
         
+        # Concurrency Selection
+        workers_frame = ttk.Frame(format_frame)
+        workers_frame.pack(fill=X, pady=5)
+        
+        ttk.Label(workers_frame, text="Concurrent Requests:").pack(side=LEFT)
+        
+        self.workers_var = IntVar(value=self.engine.max_workers)
+        self.workers_spinbox = ttk.Spinbox(
+            workers_frame,
+            from_=1,
+            to=64,
+            textvariable=self.workers_var,
+            width=5
+        )
+        self.workers_spinbox.pack(side=LEFT, padx=5)
+        
+        # Queue settings for the files started next
+        queue_frame = ttk.Frame(format_frame)
+        queue_frame.pack(fill=X, pady=5)
+        
+        ttk.Label(queue_frame, text="Priority:").pack(side=LEFT)
+        self.priority_var = IntVar(value=0)
+        ttk.Spinbox(queue_frame, from_=-10, to=10, textvariable=self.priority_var, width=4).pack(side=LEFT, padx=5)
+        
+        ttk.Label(queue_frame, text="Requests per File:").pack(side=LEFT)
+        self.job_cap_var = IntVar(value=self.engine.job_max_in_flight or 0)
+        ttk.Spinbox(queue_frame, from_=0, to=64, textvariable=self.job_cap_var, width=4).pack(side=LEFT, padx=5)
+        
         # Middle section with files and converted files
         middle_frame = ttk.Frame(main_frame)
         middle_frame.pack(fill=BOTH, expand=True, pady=10)
@@ -121,16 +175,32 @@ class DatasetGenerator:
         files_frame = ttk.LabelFrame(middle_frame, text="Input Files", padding=10)
         files_frame.pack(side=LEFT, fill=BOTH, expand=True, padx=(0, 5))
         
+        # Controls for the selected jobs
+        job_buttons = ttk.Frame(files_frame)
+        job_buttons.pack(fill=X, pady=(0, 5))
+        
+        for text, command in (
+            ("⏸️ Pause", self.pause_selected),
+            ("▶️ Resume", self.resume_selected),
+            ("✖️ Cancel", self.cancel_selected),
+            ("⬆️ Priority", lambda: self.change_priority(1)),
+            ("⬇️ Priority", lambda: self.change_priority(-1))
+        ):
+            ttk.Button(job_buttons, text=text, command=command, style='Accent.TButton').pack(side=LEFT, padx=5)
+        
+        # Rows of queued files use the job id as their item id
         self.files_list = ttk.Treeview(
             files_frame,
-            columns=("File", "Status"),
+            columns=("File", "Status", "Priority"),
             show="headings",
             height=10
         )
         self.files_list.heading("File", text="File")
         self.files_list.heading("Status", text="Status")
+        self.files_list.heading("Priority", text="Priority")
         self.files_list.column("File", width=300)
         self.files_list.column("Status", width=100)
+        self.files_list.column("Priority", width=60)
         self.files_list.pack(fill=BOTH, expand=True)
         
         files_scroll = ttk.Scrollbar(files_frame, orient=VERTICAL, command=self.files_list.yview)
@@ -230,15 +300,17 @@ class DatasetGenerator:
         # Initial refresh of converted files
         self.refresh_converted_files()
         
-    def setup_folders(self):
-        self.remaining_dir = Path("remaining_files")
-        self.converted_dir = Path("converted_files")
-        self.remaining_dir.mkdir(exist_ok=True)
-        self.converted_dir.mkdir(exist_ok=True)
+        # Jobs left unfinished by the last session, started again with "Start Processing"
+        for job in self.engine.job_queue.list():
+            self.files_list.insert("", END, iid=job.id, values=(job.file_path, job.status, job.priority))
+        if self.files_list.get_children():
+            self.start_btn.config(state='normal')
+            self.clear_btn.config(state='normal')
         
     def upload_files(self):
         files = filedialog.askopenfilenames(
             filetypes=[
+                ("Supported Files", " ".join(f"*{extension}" for extension in input_extensions())),
                 ("All Files", "*.*"),
                 ("PDF Files", "*.pdf"),
                 ("Text Files", "*.txt"),
@@ -256,392 +328,228 @@ class DatasetGenerator:
                         break
                 
                 if not existing:
-                    self.files_list.insert("", END, values=(file, "Pending"))
+                    self.files_list.insert("", END, values=(file, "Pending", ""))
             
             # Enable start and clear buttons if files are added
             self.start_btn.config(state='normal')
             self.clear_btn.config(state='normal')
             
     def clear_files(self):
-        self.files_list.delete(*self.files_list.get_children())
-        self.start_btn.config(state='disabled')
-        self.clear_btn.config(state='disabled')
-        self.progress['value'] = 0
-        self.status_label.config(text="Ready")
+        """Remove every file that is not being converted right now"""
+        for item in self.files_list.get_children():
+            status = self.files_list.item(item)["values"][1]
+            if status == "Pending" or self.engine.job_queue.remove(item):
+                self.files_list.delete(item)
+        if not self.files_list.get_children():
+            self.start_btn.config(state='disabled')
+            self.clear_btn.config(state='disabled')
+        if not self.processing:
+            self.progress['value'] = 0
+            self.status_label.config(text="Ready")
     
     def start_processing(self):
-        # Disable buttons during processing
-        self.upload_btn.config(state='disabled')
-        self.start_btn.config(state='disabled')
-        self.clear_btn.config(state='disabled')
+        """Queue the pending files (and the stopped ones again); files can be added while the queue runs"""
+        target_format = self.format_var.get()
+        priority = self.get_spinbox_value(self.priority_var, 0)
+        max_in_flight = self.get_spinbox_value(self.job_cap_var, 0) or None
         
-        # Get all pending files
-        files = []
         for item in self.files_list.get_children():
-            values = self.files_list.item(item)["values"]
-            if values[1] == "Pending":
-                files.append(values[0])
-        
-        if files:
+            file_path, status = self.files_list.item(item)["values"][:2]
+            if status == "Pending":
+                # Replace the row by one keyed by the job, at the same position
+                job = self.engine.enqueue(file_path, target_format, priority, max_in_flight)
+                index = self.files_list.index(item)
+                self.files_list.delete(item)
+                if self.files_list.exists(job.id):
+                    self.files_list.delete(job.id)
+                self.files_list.insert("", index, iid=job.id, values=(job.file_path, job.status, job.priority))
+            elif status == "Stopped":
+                self.engine.requeue_job(item)
+        self.start_runner()
+    
+    def start_runner(self):
+        """Work through the job queue on a worker thread, unless that is already happening"""
+        if not self.processing and self.engine.job_queue.queued_jobs():
+            self.processing = True
+            self.stop_btn.config(state='normal')
+            self.engine.max_workers = self.get_max_workers()
             # Start processing in a separate thread
-            threading.Thread(target=self.process_files, args=(files,), daemon=True).start()
+            threading.Thread(target=self.run_jobs, daemon=True).start()
     
-    def process_files(self, files):
-        try:
-            total_files = len(files)
-            for index, file_path in enumerate(files, 1):
-                try:
-                    self.log(f"Starting to process file: {Path(file_path).name}")
-                    self.status_label.config(text=f"Processing {Path(file_path).name} ({index}/{total_files})")
-                    
-                    # Update progress bar for file start
-                    progress = (index - 1) / total_files * 100
-                    self.progress['value'] = progress
-                    self.root.update_idletasks()  # Force UI update
-                    
-                    # Save original file
-                    dest_path = self.remaining_dir / Path(file_path).name
-                    shutil.copy2(file_path, dest_path)
-                    self.log(f"Saved original file to: {dest_path}")
-                    
-                    # Handle PDF splitting if needed
-                    if file_path.lower().endswith('.pdf'):
-                        self.log(f"PDF file detected, starting split and process")
-                        self.split_and_process_pdf(file_path)
-                    else:
-                        self.log(f"Starting conversion for file: {Path(file_path).name}")
-                        self.convert_file(file_path)
-                    
-                    self.update_file_status(file_path, "Completed")
-                    self.refresh_converted_files()  # Refresh the converted files list
-                    
-                except Exception as e:
-                    error_msg = f"Error processing {Path(file_path).name}: {str(e)}"
-                    self.log(error_msg)
-                    messagebox.showerror("Processing Error", error_msg)
-                    self.update_file_status(file_path, "Failed")
-                
-                # Update progress bar for file completion
-                progress = index / total_files * 100
-                self.progress['value'] = progress
-                self.root.update_idletasks()  # Force UI update
-            
-            self.status_label.config(text="Processing Complete")
-            self.log("All files processed")
-            messagebox.showinfo("Success", "All files have been processed")
+    def stop_processing(self):
+        """Cancel the requests in flight; unfinished files are marked Stopped and resume from their checkpoints"""
+        self.stop_btn.config(state='disabled')
+        self.engine.stop()
+        
+    def selected_jobs(self):
+        """Job ids of the selected rows that have been queued"""
+        return [item for item in self.files_list.selection() if item in self.engine.job_queue.jobs]
+        
+    def pause_selected(self):
+        for job_id in self.selected_jobs():
+            self.engine.pause_job(job_id)
             
-        except Exception as e:
-            error_msg = f"Critical error during processing: {str(e)}"
-            self.log(error_msg)
-            messagebox.showerror("Critical Error", error_msg)
-            
-        finally:
-            # Re-enable buttons after processing
-            self.root.after(0, lambda: self.upload_btn.config(state='normal'))
-            self.root.after(0, lambda: self.start_btn.config(state='normal'))
-            self.root.after(0, lambda: self.clear_btn.config(state='normal'))
-            self.refresh_converted_files()  # Final refresh of converted files list
-        
-    def split_and_process_pdf(self, file_path, max_size_mb=10):
-        doc = fitz.open(file_path)
-        total_pages = doc.page_count
-        
-        # Calculate pages per chunk based on file size
-        file_size_mb = Path(file_path).stat().st_size / (1024 * 1024)
-        pages_per_chunk = max(1, int(total_pages * (max_size_mb / file_size_mb)))
-        
-        for start in range(0, total_pages, pages_per_chunk):
-            end = min(start + pages_per_chunk, total_pages)
-            new_doc = fitz.open()
-            new_doc.insert_pdf(doc, from_page=start, to_page=end-1)
+    def resume_selected(self):
+        for job_id in self.selected_jobs():
+            self.engine.resume_job(job_id)
+        self.start_runner()  # Resumed jobs that had not started yet are queued again
             
-            chunk_path = self.remaining_dir / f"{Path(file_path).stem}_part_{start+1}.pdf"
-            new_doc.save(chunk_path)
-            new_doc.close()
+    def cancel_selected(self):
+        for job_id in self.selected_jobs():
+            self.engine.cancel_job(job_id)
             
-            self.convert_file(str(chunk_path))
-            
-        doc.close()
+    def change_priority(self, step):
+        for job_id in self.selected_jobs():
+            self.engine.set_job_priority(job_id, self.engine.job_queue.jobs[job_id].priority + step)
         
-    def convert_file(self, file_path):
+    def run_jobs(self):
+        """Runs on the worker thread, so it only talks to the UI through the event queue"""
         try:
-            self.log(f"Reading content from: {Path(file_path).name}")
-            content = self.read_file_content(file_path)
-            
-            target_format = self.format_var.get()
-            self.log(f"Converting to format: {target_format}")
-            
-            # Generate conversion using AI
-            converted_data = self.ai_conversion(content, target_format)
-            
-            # Save converted file
-            output_path = self.converted_dir / f"{Path(file_path).stem}_{uuid.uuid4().hex[:6]}{self.get_extension(target_format)}"
-            self.log(f"Saving converted file to: {output_path}")
-            
-            self.save_converted(converted_data, output_path, target_format)
-            self.log(f"Successfully converted: {output_path.name}")
-            
-            # Refresh the converted files list
-            self.refresh_converted_files()
+            results = self.engine.run_jobs()
+            if "Stopped" in results.values():
+                self.handle_engine_event("message", {"kind": "info", "title": "Stopped", "text": "Processing was stopped, start it again to resume"})
+            else:
+                self.handle_engine_event("message", {"kind": "info", "title": "Success", "text": "All files have been processed"})
             
         except Exception as e:
-            error_msg = f"Conversion Error for {Path(file_path).name}: {str(e)}"
-            self.log(error_msg)
-            self.rotate_api_key()
-            raise Exception(error_msg)
-        
-    def read_file_content(self, file_path):
-        ext = Path(file_path).suffix.lower()
-        if ext == '.pdf':
-            doc = fitz.open(file_path)
-            content = ""
-            for page in doc:
-                content += page.get_text()
-            doc.close()
-            return content
-        elif ext == '.csv':
-            df = pd.read_csv(file_path)
-            return df.to_string()
-        elif ext == '.json':
-            with open(file_path) as f:
-                return json.dumps(json.load(f), indent=2)
-        else:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
-                
-    def ai_conversion(self, content, target_format):
-        max_retries = 3
-        retry_count = 0
-        converted_chunks = []
-        
-        # Prepare content chunks with smaller size
-        max_chunk_size = 2000  # Reduced chunk size for better reliability
-        content_chunks = [content[i:i + max_chunk_size] 
-                        for i in range(0, len(content), max_chunk_size)]
-        
-        self.log(f"Content split into {len(content_chunks)} chunks")
-        chunk_index = 0
-        
-        while chunk_index < len(content_chunks):
-            try:
-                self.log(f"Attempt {retry_count + 1}/{max_retries} - Using API Key #{self.current_key_index + 1}")
-                
-                while chunk_index < len(content_chunks):
-                    chunk = content_chunks[chunk_index]
-                    self.log(f"Processing chunk {chunk_index + 1}/{len(content_chunks)}")
-                    
-                    # Prepare system message based on format
-                    system_message = self.get_system_message(target_format)
-                    
-                    messages = [
-                        {"role": "system", "content": system_message},
-                        {"role": "user", "content": f"Convert this content into {target_format}. Content: {chunk}"}
-                    ]
-
-                    try:
-                        self.log(f"Sending chunk {chunk_index + 1} to API")
-                        
-                        # Make API request using requests library
-                        headers = {
-                            "Authorization": f"Bearer {self.current_api_key}",
-                            "Content-Type": "application/json",
-                            "Accept": "application/json"
-                        }
-                        
-                        data = {
-                            "model": "Meta-Llama-3.1-8B-Instruct",
-                            "messages": messages,
-                            "temperature": 0.1,
-                            "top_p": 0.1,
-                            "max_tokens": 1500,
-                            "presence_penalty": 0,
-                            "frequency_penalty": 0
-                        }
-                        
-                        response = requests.post(
-                            "https://api.sambanova.ai/v1/chat/completions",
-                            headers=headers,
-                            json=data,
-                            timeout=30
-                        )
-                        
-                        if response.status_code == 429:  # Rate limit exceeded
-                            self.log("Rate limit reached, switching API key and waiting...")
-                            self.rotate_api_key()
-                            time.sleep(5)  # Wait longer when rate limited
-                            raise Exception("Rate limit exceeded")
-                        
-                        if response.status_code != 200:
-                            error_data = response.json()
-                            error_msg = error_data.get('error', {}).get('message', 'Unknown error')
-                            raise Exception(f"API request failed with status {response.status_code}: {error_msg}")
-                            
-                        response_data = response.json()
-                        if not response_data.get("choices") or not response_data["choices"][0].get("message", {}).get("content"):
-                            raise Exception("Empty response from API")
-                            
-                        converted_chunks.append(response_data["choices"][0]["message"]["content"])
-                        self.log(f"Successfully processed chunk {chunk_index + 1}")
-                        chunk_index += 1  # Move to next chunk only on success
-                        time.sleep(1)  # Add small delay between successful requests
-                        
-                    except Exception as chunk_error:
-                        if "Rate limit exceeded" in str(chunk_error):
-                            raise chunk_error  # Re-raise rate limit error to handle it in outer loop
-                        error_msg = f"Error processing chunk {chunk_index + 1}: {str(chunk_error)}"
-                        self.log(error_msg)
-                        raise Exception(error_msg)
-                
-                # If we get here, all chunks were processed successfully
-                self.log("All chunks processed successfully")
-                break
-                
-            except Exception as e:
-                if "Rate limit exceeded" in str(e):
-                    continue  # Continue with new API key without incrementing retry count
-                    
-                retry_count += 1
-                error_msg = f"API Error (Attempt {retry_count}/{max_retries}): {str(e)}"
-                self.log(error_msg)
-                
-                if retry_count < max_retries:
-                    self.rotate_api_key()
-                    self.log(f"Retrying with API Key #{self.current_key_index + 1}")
-                    time.sleep(3)  # Delay between retries
-                else:
-                    raise Exception(f"Failed to convert after {max_retries} attempts. Last error: {str(e)}")
-        
-        # Combine chunks based on format
-        self.log("Combining processed chunks")
-        if target_format in ["JSONL", "CSV", "Table Format"]:
-            return self.combine_structured_chunks(converted_chunks, target_format)
-        else:
-            return "\n\n".join(converted_chunks)
-        
-    def get_system_message(self, target_format):
-        """Get appropriate system message based on format"""
-        base_message = "You are a data formatting expert. Your task is to convert the given content into the specified format while preserving the important information."
-        
-        format_specific = {
-            "Alpaca Format": """Format the content into clear instruction-input-output JSON format. Each section should be concise and meaningful.
-                Structure: {"instruction": "...", "input": "...", "output": "..."}""",
-            "Prompt-Completion Format": """Create natural prompt-completion pairs from the content.
-                Structure: {"prompt": "...", "completion": "..."}""",
-            "Chat Format": """Convert content into a flowing conversation format.
-                Structure: {"messages": [{"role": "system"/"user"/"assistant", "content": "..."}]}""",
-            "Q/A Format": """Extract key questions and answers from the content.
-                Structure: {"question": "...", "answer": "..."}""",
-            "JSONL": """Create JSONL format with text and summary for each logical section.
-                Structure: {"text": "...", "summary": "..."}""",
-            "CSV": """Convert content into CSV format with relevant columns.""",
-            "Table Format": """Create a structured table with appropriate headers and data rows."""
-        }
-        
-        return f"{base_message}\n\n{format_specific.get(target_format, '')}"
-        
-    def combine_structured_chunks(self, chunks, format_name):
-        if format_name == "JSONL":
-            # Combine JSONL by keeping all valid JSON lines
-            combined = []
-            for chunk in chunks:
-                for line in chunk.split('\n'):
-                    try:
-                        json.loads(line.strip())
-                        combined.append(line.strip())
-                    except:
-                        continue
-            return '\n'.join(combined)
-            
-        elif format_name in ["CSV", "Table Format"]:
-            # Keep headers from first chunk, combine data rows from all chunks
-            chunks_lines = [chunk.split('\n') for chunk in chunks]
-            headers = chunks_lines[0][0]
-            data_rows = []
-            for chunk_lines in chunks_lines:
-                data_rows.extend(chunk_lines[1:])
-            return headers + '\n' + '\n'.join(data_rows)
+            error_msg = f"Critical error during processing: {str(e)}"
+            self.handle_engine_event("log", {"message": error_msg})
+            self.handle_engine_event("message", {"kind": "error", "title": "Critical Error", "text": error_msg})
             
-        return '\n\n'.join(chunks)  # Default combination for other formats
+        finally:
+            # Re-enable buttons after processing
+            self.handle_engine_event("processing_done", {})
         
-    def get_extension(self, format_name):
-        format_extensions = {
-            "JSONL": ".jsonl",
-            "CSV": ".csv",
-            "Table Format": ".csv",
-        }
-        return format_extensions.get(format_name, ".txt")
+    def handle_engine_event(self, event, data):
+        """Queue an engine event; called from worker threads, so no widgets are touched here"""
+        self.ui_events.put((event, data, time.strftime('%H:%M:%S')))
+        
+    def drain_ui_events(self):
+        """Apply queued worker events to the widgets in one batch per tick"""
+        log_lines = []
+        status = progress = None
+        outputs = []
+        messages = []
         
-    def save_converted(self, data, path, format_name):
         try:
-            if format_name in ["CSV", "Table Format"]:
-                # Convert string data to CSV
-                lines = [line.strip().split(',') for line in data.split('\n') if line.strip()]
-                with open(path, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.writer(f)
-                    writer.writerows(lines)
-            elif format_name == "JSONL":
-                # Ensure each line is valid JSON
-                with open(path, 'w', encoding='utf-8') as f:
-                    for line in data.split('\n'):
-                        if line.strip():
-                            try:
-                                json_obj = json.loads(line)
-                                f.write(json.dumps(json_obj) + '\n')
-                            except:
-                                f.write(json.dumps({"text": line}) + '\n')
+            for _ in range(UI_MAX_EVENTS_PER_TICK):
+                event, data, timestamp = self.ui_events.get_nowait()
+                if event == "log":
+                    log_lines.append(f"{timestamp} - {data['message']}")
+                elif event == "status":
+                    status = data["text"]
+                elif event == "progress":
+                    progress = data["value"]
+                elif event == "file_status":
+                    self.update_file_status(data["file_path"], data["status"], data.get("job_id"))
+                elif event == "file_error":
+                    messages.append(("error", "Processing Error", data["message"]))
+                elif event == "message":
+                    messages.append((data["kind"], data["title"], data["text"]))
+                elif event == "output":
+                    outputs.append(Path(data["path"]))
+                elif event == "processing_done":
+                    self.processing = False
+                    self.stop_btn.config(state='disabled')
+                    # Files queued just as the last job finished are picked up by a new run
+                    self.start_runner()
+        except queue.Empty:
+            pass
+        
+        # Only the latest status and progress matter, and the log is written once per batch
+        if log_lines:
+            self.write_console(log_lines)
+        if status is not None:
+            self.status_label.config(text=status)
+        if progress is not None:
+            self.progress['value'] = progress
+        for path in outputs:
+            self.add_converted_file(path)  # Add new outputs to the converted files list
+        
+        # Reschedule before showing dialogs, which block until dismissed
+        self.root.after(UI_TICK_MS, self.drain_ui_events)
+        for kind, title, text in messages:
+            if kind == "error":
+                messagebox.showerror(title, text)
             else:
-                # Save as plain text for other formats
-                with open(path, 'w', encoding='utf-8') as f:
-                    f.write(data)
-                    
-        except Exception as e:
-            self.log(f"Error saving file: {str(e)}")
-            
-    def rotate_api_key(self):
-        self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
-        self.log(f"Switched to API Key #{self.current_key_index + 1}")
+                messagebox.showinfo(title, text)
+        
+    def get_max_workers(self):
+        """Get the number of chunk requests allowed in flight at once"""
+        try:
+            return max(1, int(self.workers_var.get()))
+        except (TclError, ValueError):
+            return self.engine.max_workers
         
-    def update_file_status(self, file_path, status):
+    @staticmethod
+    def get_spinbox_value(variable, default):
+        try:
+            return int(variable.get())
+        except (TclError, ValueError):
+            return default
+        
+    def update_file_status(self, file_path, status, job_id=None):
+        job = self.engine.job_queue.jobs.get(job_id)
+        if job is not None:
+            if self.files_list.exists(job_id):
+                self.files_list.item(job_id, values=(file_path, status, job.priority))
+            return
         for item in self.files_list.get_children():
             if self.files_list.item(item)["values"][0] == file_path:
-                self.files_list.item(item, values=(file_path, status))
+                self.files_list.item(item, values=(file_path, status, ""))
                 break
                 
     def log(self, message):
         """Log a message to the console with timestamp"""
+        self.write_console([f"{time.strftime('%H:%M:%S')} - {message}"])
+        
+    def write_console(self, lines):
+        for line in lines:
+            self.file_logger.info(line)
+        
+        # Only the most recent lines are kept in the widget
+        lines = lines[-CONSOLE_MAX_LINES:]
         self.console.configure(state='normal')  # Temporarily enable writing
-        self.console.insert(END, f"{time.strftime('%H:%M:%S')} - {message}\n")
+        self.console.insert(END, "\n".join(lines) + "\n")
+        line_count = int(self.console.index('end-1c').split('.')[0]) - 1
+        if line_count > CONSOLE_MAX_LINES:
+            self.console.delete('1.0', f'{line_count - CONSOLE_MAX_LINES + 1}.0')
         self.console.see(END)  # Auto-scroll to bottom
         self.console.configure(state='disabled')  # Make read-only again
         
-    @property
-    def current_api_key(self):
-        return self.api_keys[self.current_key_index]
-        
     def refresh_converted_files(self):
         """Refresh the list of converted files"""
         # Clear existing items
         self.converted_list.delete(*self.converted_list.get_children())
+        self.converted_items = {}
         
-        # Get all files in converted directory
+        # Get all files in converted directory (scandir avoids a separate stat() per file on Windows)
         if self.converted_dir.exists():
-            for file_path in self.converted_dir.glob('*'):
-                if file_path.is_file():
-                    # Get file format from extension
-                    file_format = file_path.suffix.lstrip('.')
-                    # Get file size
-                    size_bytes = file_path.stat().st_size
-                    size_str = self.format_file_size(size_bytes)
-                    
-                    self.converted_list.insert("", END, values=(file_path.name, file_format.upper(), size_str))
+            with os.scandir(self.converted_dir) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        self.show_converted_file(entry.name, entry.stat().st_size)
     
-    def format_file_size(self, size_bytes):
-        """Format file size in bytes to human readable format"""
-        for unit in ['B', 'KB', 'MB', 'GB']:
-            if size_bytes < 1024:
-                return f"{size_bytes:.1f} {unit}"
-            size_bytes /= 1024
-        return f"{size_bytes:.1f} TB"
+    def add_converted_file(self, file_path):
+        """Add or update a single converted file without rescanning the folder"""
+        if file_path.parent.resolve() != self.converted_dir.resolve():
+            return
+        try:
+            size_bytes = file_path.stat().st_size
+        except OSError:
+            return
+        self.show_converted_file(file_path.name, size_bytes)
+    
+    def show_converted_file(self, file_name, size_bytes):
+        # Get file format from extension
+        file_format = Path(file_name).suffix.lstrip('.')
+        values = (file_name, file_format.upper(), format_file_size(size_bytes))
+        
+        item = self.converted_items.get(file_name)
+        if item is not None:
+            self.converted_list.item(item, values=values)
+        else:
+            self.converted_items[file_name] = self.converted_list.insert("", END, values=values)
     
     def open_converted_folder(self):
         """Open the converted files folder in file explorer"""
@@ -0,0 +1,207 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+
+WORD = re.compile(r"\w+")
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+def record_text(record):
+    """All the text of a record (dict, CSV row or string) in a stable order"""
+    if isinstance(record, str):
+        return record
+    if isinstance(record, dict):
+        return " ".join(record_text(record[key]) for key in sorted(record))
+    if isinstance(record, (list, tuple)):
+        return " ".join(record_text(item) for item in record)
+    return "" if record is None else str(record)
+
+
+def normalize(text):
+    """Lowercased words only, so formatting and punctuation differences do not matter"""
+    return WORD.findall(text.lower())
+
+
+class MinHasher:
+    """MinHash signatures over word shingles, computed with numpy"""
+
+    def __init__(self, num_perm=64, shingle_size=3, seed=1):
+        # numpy is imported with the first hasher, not when the module loads
+        import numpy as np
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        # Fixed seed: signatures stored by earlier runs must stay comparable
+        generator = np.random.RandomState(seed)
+        self.a = generator.randint(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.b = generator.randint(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, words):
+        import numpy as np
+        size = self.shingle_size
+        shingles = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+        hashes = np.array([zlib.crc32(shingle.encode("utf-8")) for shingle in shingles], dtype=np.uint64)
+        hashes %= MERSENNE_PRIME
+        values = (hashes[:, None] * self.a + self.b) % MERSENNE_PRIME
+        return values.min(axis=0).astype(np.uint32)
+
+
+class DedupIndex:
+    """Exact-hash set plus a MinHash/LSH index of every record written, kept in SQLite.
+
+    Each record is remembered with the output file it went to, so the index
+    works across files and runs, and an output file that is rewritten (for
+    example when a job resumes) can forget its old records first. Records may
+    also name their origin (the input file): those of other outputs of the
+    same origin, such as an earlier conversion of that file, are not duplicates.
+    """
+
+    def __init__(self, path, threshold=0.85, num_perm=64, bands=16, min_words=8):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.min_words = min_words
+        self.num_perm = num_perm
+        self.hasher = None  # Created with the first record long enough for MinHash
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self.records_seen = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS exact (hash TEXT PRIMARY KEY, source TEXT NOT NULL, origin TEXT)")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS signatures (
+                id INTEGER PRIMARY KEY,
+                source TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                origin TEXT
+            )"""
+        )
+        # Indexes made before origins were recorded
+        for table in ("exact", "signatures"):
+            if "origin" not in [row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")]:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN origin TEXT")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS bands (band INTEGER, bucket INTEGER, record_id INTEGER)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS bands_bucket ON bands (band, bucket)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS exact_source ON exact (source)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS signatures_source ON signatures (source)")
+        self.conn.commit()
+
+    def band_buckets(self, signature):
+        for band in range(self.bands):
+            digest = hashlib.blake2b(signature[band * self.rows:(band + 1) * self.rows].tobytes(), digest_size=8).digest()
+            yield band, int.from_bytes(digest, "big", signed=True)
+
+    def check(self, record, source, origin=None, remember=True):
+        """Return "exact" or "near" for a duplicate, otherwise remember the record (unless told not to) and return None"""
+        words = normalize(record_text(record))
+        if not words:
+            return None
+        exact_hash = hashlib.sha256(" ".join(words).encode("utf-8")).hexdigest()
+        signature = None
+        if len(words) >= self.min_words:
+            if self.hasher is None:
+                self.hasher = MinHasher(self.num_perm)
+            signature = self.hasher.signature(words)
+        source = str(source)
+        origin = str(origin) if origin is not None else None
+
+        with self.lock:
+            self.records_seen += 1
+            row = self.conn.execute("SELECT source, origin FROM exact WHERE hash = ?", (exact_hash,)).fetchone()
+            if row and not self.same_origin(row, source, origin):
+                self.exact_duplicates += 1
+                return "exact"
+            if signature is not None:
+                buckets = list(self.band_buckets(signature))
+                if self.find_similar(signature, buckets, source, origin):
+                    self.near_duplicates += 1
+                    return "near"
+            if not remember:
+                return None
+
+            # A hash left by another output of the same origin now belongs to this one
+            self.conn.execute(
+                "INSERT OR REPLACE INTO exact (hash, source, origin) VALUES (?, ?, ?)", (exact_hash, source, origin)
+            )
+            if signature is not None:
+                record_id = self.conn.execute(
+                    "INSERT INTO signatures (source, signature, origin) VALUES (?, ?, ?)",
+                    (source, signature.tobytes(), origin)
+                ).lastrowid
+                self.conn.executemany(
+                    "INSERT INTO bands (band, bucket, record_id) VALUES (?, ?, ?)",
+                    [(band, bucket, record_id) for band, bucket in buckets]
+                )
+            return None
+
+    def source_of(self, record):
+        """Output file holding an exact duplicate of a record, or None"""
+        words = normalize(record_text(record))
+        exact_hash = hashlib.sha256(" ".join(words).encode("utf-8")).hexdigest()
+        with self.lock:
+            row = self.conn.execute("SELECT source FROM exact WHERE hash = ?", (exact_hash,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def same_origin(row, source, origin):
+        # Repeats within the same output still count, so a file's repeated content is caught
+        other_source, other_origin = row
+        return origin is not None and other_origin == origin and other_source != source
+
+    def find_similar(self, signature, buckets, source=None, origin=None):
+        """LSH lookup: records sharing a band are candidates, confirmed by estimated Jaccard similarity"""
+        import numpy as np
+        candidates = set()
+        for band, bucket in buckets:
+            rows = self.conn.execute("SELECT record_id FROM bands WHERE band = ? AND bucket = ?", (band, bucket))
+            candidates.update(record_id for (record_id,) in rows)
+        for record_id in candidates:
+            row = self.conn.execute("SELECT signature, source, origin FROM signatures WHERE id = ?", (record_id,)).fetchone()
+            if not row or self.same_origin(row[1:], source, origin):
+                continue
+            if np.mean(np.frombuffer(row[0], dtype=np.uint32) == signature) >= self.threshold:
+                return True
+        return False
+
+    def forget(self, source):
+        """Drop the records of an output file that is about to be rewritten"""
+        source = str(source)
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM bands WHERE record_id IN (SELECT id FROM signatures WHERE source = ?)", (source,)
+            )
+            self.conn.execute("DELETE FROM signatures WHERE source = ?", (source,))
+            self.conn.execute("DELETE FROM exact WHERE source = ?", (source,))
+            self.conn.commit()
+
+    def prune_missing(self):
+        """Forget the records of output files that have since been deleted"""
+        with self.lock:
+            sources = [source for (source,) in self.conn.execute("SELECT DISTINCT source FROM exact")]
+        for source in sources:
+            # Sources like "manifest.jsonl#part" name a part inside a file
+            if not Path(source).exists() and not Path(source.split("#", 1)[0]).exists():
+                self.forget(source)
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "records": self.records_seen,
+                "exact_duplicates": self.exact_duplicates,
+                "near_duplicates": self.near_duplicates
+            }
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
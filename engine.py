@@ -0,0 +1,1086 @@
+import os
+import shutil
+from dotenv import load_dotenv
+import uuid
+import multiprocessing
+import re
+import threading
+from collections import deque
+from functools import partial
+from concurrent.futures import (
+    FIRST_COMPLETED, Future, InvalidStateError, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+)
+from pathlib import Path
+import time
+from api_client import RequestCancelled
+from backends import create_router, load_keys
+from metrics import Metrics
+from extractors import balanced_ranges, csv_part_offsets, ocr_pages, profile_pdf, tesseract_installed
+from chunker import BoundaryChunker, FixedSizeChunker, get_token_counter
+from response_cache import ResponseCache
+from checkpoints import JobJournal
+from output_sinks import open_sink
+from parsers import StreamingParser, create_parser, format_instructions
+from dedup import DedupIndex
+from packing import PACK_INSTRUCTIONS, ChunkPacker, new_tag, pack_sections, split_sections
+from shards import ShardWriter
+from job_queue import JobQueue, RequestScheduler, SharedCancel
+from plugins import reader_for
+
+WRITTEN = object()  # Stands in for the records of chunks already written to the output
+FILE_THREADS = 256  # Files running at once, paused ones included
+
+# Load environment variables
+load_dotenv()
+
+FORMATS = [
+    "Alpaca Format",
+    "Prompt-Completion Format",
+    "Chat Format",
+    "Q/A Format",
+    "Instruction-Context-Response Format",
+    "JSONL",
+    "CSV",
+    "Table Format"
+]
+
+
+def format_file_size(size_bytes):
+    """Format file size in bytes to human readable format"""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size_bytes < 1024:
+            return f"{size_bytes:.1f} {unit}"
+        size_bytes /= 1024
+    return f"{size_bytes:.1f} TB"
+
+
+def extract_chunks(file_path, chunker, start=None, end=None, ocr_text=None):
+    """Read a file (or a page range of a PDF) and split it into chunks.
+
+    Runs inside the extraction worker processes, so it only takes picklable arguments.
+    For CSVs, start and end are byte offsets of rows instead of page numbers.
+    ocr_text holds the OCR'd text of PDF pages without a text layer.
+    Returns the chunks, the time spent producing them and the number of repeated
+    header/footer lines stripped from the pages.
+    """
+    started = time.perf_counter()
+    # The reader registered for the file's extension, imported on first use
+    chunks, furniture_lines = reader_for(file_path)(file_path, chunker, start, end, ocr_text)
+    return chunks, time.perf_counter() - started, furniture_lines
+
+
+class ConversionEngine:
+    """Runs the read -> chunk -> convert -> save pipeline without any UI.
+
+    Progress is reported as events to the registered listeners, each called
+    as `listener(event, data)`. Events are "log", "status", "progress",
+    "file_status", "file_error", "output" and "finished".
+    
+    Files are converted as jobs of a persistent priority queue (see job_queue.py),
+    which can be paused, cancelled or re-prioritized while the engine runs.
+    """
+
+    def __init__(self, api_keys=None, converted_dir="converted_files", remaining_dir="remaining_files",
+                 cache_dir="cache", max_workers=None, chunker=None, ingest_workers=None, metrics=None,
+                 dedup=None, output_mode=None, shard_max_mb=None, shard_compression=None):
+        self.api_keys = load_keys("SAMBANOVA") if api_keys is None else api_keys
+        self.listeners = []
+        # Stage timings and counters, written as JSON lines and summarized per job
+        self.metrics = metrics or Metrics(
+            os.getenv("METRICS_FILE", "logs/metrics.jsonl"),
+            prometheus_path=os.getenv("METRICS_PROMETHEUS_FILE") or None
+        )
+        # Every configured backend has its own keys, quotas and pooled keep-alive sessions;
+        # the router picks the fastest one with free quota for each request
+        self.stream_responses = os.getenv("STREAM_RESPONSES", "1").lower() not in ("0", "false", "no")
+        self.router = create_router(
+            self.api_keys,
+            timeout=int(os.getenv("API_TIMEOUT", 30)),
+            http2=os.getenv("HTTP2", "").lower() in ("1", "true", "yes"),
+            stream=self.stream_responses,
+            log=self.log,
+            metrics=self.metrics
+        )
+        # Streamed requests are cut off once a chunk has been in flight this long (0 for no limit);
+        # the records received by then are kept
+        self.chunk_deadline = float(os.getenv("CHUNK_DEADLINE_SECONDS", 120))
+        # Set by stop() to cancel the requests in flight and the files not started yet
+        self.stop_event = threading.Event()
+        # Number of chunk requests kept in flight (defaults to two per API key)
+        self.max_workers = max_workers or int(os.getenv("MAX_CONCURRENT_REQUESTS", 2 * max(1, self.router.key_count)))
+        # Requests a single job may have in flight (0: any number); jobs of equal priority take turns either way
+        self.job_max_in_flight = int(os.getenv("JOB_MAX_IN_FLIGHT", 0)) or None
+        self.router.set_pool_size(self.max_workers)
+        # Times a chunk is re-requested when its response has no valid records
+        self.max_validation_retries = int(os.getenv("MAX_VALIDATION_RETRIES", 2))
+        # Number of files extracted and chunked in parallel worker processes
+        self.ingest_workers = ingest_workers or int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+        self.dispatch_pool = None
+        self.extract_pool = None
+        # PDFs are split into parts of about this many tokens of text
+        self.pdf_part_tokens = int(os.getenv("PDF_PART_TOKENS", 50000))
+        # Pages without a text layer are OCR'd with tesseract, when it is installed, in their own process pool
+        # (its language data is only looked up there, on the first scanned page)
+        self.ocr_enabled = os.getenv("OCR", "auto").lower() not in ("0", "false", "no") and tesseract_installed()
+        self.ocr_language = os.getenv("OCR_LANGUAGE", "eng")
+        self.ocr_dpi = int(os.getenv("OCR_DPI", 300))
+        self.ocr_workers = int(os.getenv("OCR_WORKERS", os.cpu_count() or 1))
+        self.ocr_pool = None
+        self.chunker = chunker or self.create_chunker()
+        # Small chunks (short files, document tails) are bundled several to a request
+        self.packer = ChunkPacker(
+            self.convert_packed,
+            max_tokens=int(os.getenv("PACK_MAX_TOKENS", 1000)),
+            max_chunks=int(os.getenv("PACK_MAX_CHUNKS", 8)),
+            linger=int(os.getenv("PACK_LINGER_MS", 200)) / 1000
+        ) if os.getenv("PACK_CHUNKS", "1").lower() not in ("0", "false", "no") else None
+        self.pack_max_output_tokens = int(os.getenv("PACK_MAX_OUTPUT_TOKENS", 4096))
+        self.count_tokens = get_token_counter()
+        
+        self.setup_folders(converted_dir, remaining_dir, cache_dir)
+        
+        # Queued, paused and stopped jobs are kept on disk and picked up again after a restart
+        self.job_queue = JobQueue(os.getenv("JOB_QUEUE_FILE") or self.checkpoint_dir / "queue.jsonl")
+        
+        # Responses are cached on disk so re-runs do not pay for chunks twice
+        self.response_cache = ResponseCache(
+            self.cache_dir / "responses.sqlite3",
+            max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_MB", 500)) * 1024 * 1024
+        )
+        
+        # Records already written to any output file, so duplicates are dropped across files and runs
+        if dedup is None:
+            dedup = os.getenv("DEDUP", "1").lower() not in ("0", "false", "no")
+        self.dedup_index = DedupIndex(
+            self.cache_dir / "dedup.sqlite3",
+            threshold=float(os.getenv("DEDUP_THRESHOLD", 0.85))
+        ) if dedup else None
+        # Input chunks already sent for conversion, one index per format, so repeated
+        # content (boilerplate pages, tables of contents) is not paid for twice
+        chunk_dedup = os.getenv("CHUNK_DEDUP", "1").lower() not in ("0", "false", "no")
+        self.chunk_indexes = {} if chunk_dedup else None
+        self.chunk_dedup_threshold = float(os.getenv("CHUNK_DEDUP_THRESHOLD", 0.9))
+        self.lock = threading.Lock()
+        
+        # "files" writes one file per part; "shards" appends every part to compressed,
+        # size-bounded shards indexed by converted_files/manifest.jsonl
+        output_mode = (output_mode or os.getenv("OUTPUT_MODE", "files")).lower()
+        self.shard_writer = None
+        if output_mode == "shards":
+            compression = (shard_compression or os.getenv("SHARD_COMPRESSION", "gzip")).lower()
+            self.shard_writer = ShardWriter(
+                self.converted_dir,
+                max_bytes=int(float(shard_max_mb or os.getenv("SHARD_MAX_MB", 256)) * 1024 * 1024),
+                compression=compression
+            )
+        
+    def setup_folders(self, converted_dir, remaining_dir, cache_dir):
+        self.remaining_dir = Path(remaining_dir)
+        self.converted_dir = Path(converted_dir)
+        self.cache_dir = Path(cache_dir)
+        self.checkpoint_dir = self.converted_dir / ".checkpoints"
+        self.remaining_dir.mkdir(parents=True, exist_ok=True)
+        self.converted_dir.mkdir(parents=True, exist_ok=True)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.checkpoint_dir.mkdir(exist_ok=True)
+        
+    @staticmethod
+    def create_chunker():
+        """Build the chunker configured in the environment"""
+        if os.getenv("CHUNKER", "boundary").lower() == "fixed":
+            return FixedSizeChunker(int(os.getenv("CHUNK_MAX_CHARS", 2000)))
+        return BoundaryChunker(
+            max_tokens=int(os.getenv("CHUNK_MAX_TOKENS", 1000)),
+            overlap_tokens=int(os.getenv("CHUNK_OVERLAP_TOKENS", 0))
+        )
+        
+    def report_metrics(self, summary):
+        """Log the end-of-job metrics summary and pass it on to listeners"""
+        self.log(
+            f"Metrics: {summary['chunks']:.0f} chunks in {summary['elapsed_seconds']:.1f}s "
+            f"({summary['chunks_per_second']:.2f} chunks/s), tokens in/out "
+            f"{summary['tokens_in']:.0f}/{summary['tokens_out']:.0f}, retries {summary['retries']:.0f}, "
+            f"cache hit rate {summary['cache_hit_rate']:.0%}"
+        )
+        invalid_records = summary["counters"].get("invalid_records", {}).get("total", 0)
+        validation_retries = summary["counters"].get("validation_retries", {}).get("total", 0)
+        if invalid_records or validation_retries:
+            self.log(
+                f"Metrics: {validation_retries:.0f} chunks re-requested after failing validation, "
+                f"{invalid_records:.0f} invalid records dropped"
+            )
+        if summary["records_written"] or summary["duplicates"]:
+            self.log(
+                f"Metrics: {summary['duplicates']:.0f} duplicate records dropped of "
+                f"{summary['records_written'] + summary['duplicates']:.0f} ({summary['dedup_ratio']:.1%})"
+            )
+        skipped = summary["counters"].get("chunks_skipped", {})
+        if skipped or summary["counters"].get("furniture_lines"):
+            self.log(
+                f"Metrics: {sum(skipped.values()):.0f} repeated chunks skipped (API calls avoided), "
+                f"{sum(summary['counters'].get('furniture_lines', {}).values()):.0f} header/footer lines stripped"
+            )
+        if summary["rate_limited"]:
+            per_key = ", ".join(f"{key}: {count:.0f}" for key, count in sorted(summary["rate_limited"].items()))
+            self.log(f"Metrics: 429 responses by API key ({per_key})")
+        packed = summary["counters"].get("packed_requests", {}).get("total", 0)
+        if packed:
+            self.log(
+                f"Metrics: {summary['counters'].get('packed_chunks', {}).get('total', 0):.0f} chunks sent in "
+                f"{packed:.0f} packed requests, {summary['counters'].get('pack_fallbacks', {}).get('total', 0):.0f} sent again on their own"
+            )
+        routed = summary["counters"].get("routed", {})
+        if len(routed) > 1 or summary["counters"].get("failovers"):
+            per_backend = ", ".join(f"{backend}: {count:.0f}" for backend, count in sorted(routed.items()))
+            self.log(f"Metrics: requests by backend ({per_backend}), {sum(summary['counters'].get('failovers', {}).values()):.0f} failovers")
+        for stage, stats in sorted(summary["stages"].items()):
+            self.log(
+                f"Metrics: {stage} n={stats['count']} total={stats['total_seconds']:.1f}s "
+                f"p50={stats['p50_seconds']:.3f}s p99={stats['p99_seconds']:.3f}s"
+            )
+        self.emit("metrics", summary=summary)
+        
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+        
+    def emit(self, event, **data):
+        for listener in self.listeners:
+            listener(event, data)
+            
+    def log(self, message):
+        self.emit("log", message=message)
+        
+    def stop(self):
+        """Stop the running job: requests in flight are cancelled and files not started yet are skipped"""
+        if not self.stop_event.is_set():
+            self.stop_event.set()
+            for job in self.job_queue.running_jobs():
+                job.cancel_event.set()
+            self.log("Stopping: cancelling requests in flight")
+        
+    def job_changed(self, job):
+        if self.dispatch_pool:
+            self.dispatch_pool.wake()
+        self.emit("file_status", file_path=job.file_path, status=job.status, job_id=job.id)
+        return job
+        
+    def enqueue(self, file_path, target_format, priority=0, max_in_flight=None):
+        """Add a file to the job queue (higher priorities are converted first) and return its job"""
+        return self.job_changed(self.job_queue.add(file_path, target_format, priority, max_in_flight))
+        
+    def pause_job(self, job_id):
+        job = self.job_queue.pause(job_id)
+        self.log(f"Paused {Path(job.file_path).name}")
+        return self.job_changed(job)
+        
+    def resume_job(self, job_id):
+        job = self.job_queue.resume(job_id)
+        self.log(f"Resumed {Path(job.file_path).name}")
+        return self.job_changed(job)
+        
+    def cancel_job(self, job_id):
+        job = self.job_queue.cancel(job_id)
+        self.log(f"Cancelling {Path(job.file_path).name}")
+        return self.job_changed(job)
+        
+    def requeue_job(self, job_id):
+        return self.job_changed(self.job_queue.requeue(job_id))
+        
+    def set_job_priority(self, job_id, priority):
+        return self.job_changed(self.job_queue.set_priority(job_id, priority))
+        
+    def process_files(self, files, target_format, priority=0, max_in_flight=None):
+        """Queue every file, convert them and return a dict mapping each file path to its final status"""
+        jobs = [self.enqueue(file_path, target_format, priority, max_in_flight) for file_path in files]
+        return self.run_jobs({job.id for job in jobs})
+        
+    def run_jobs(self, job_ids=None):
+        """Convert queued jobs (all of them, or those in job_ids) until none is left to start.
+
+        Jobs are taken by priority, and jobs queued while this runs are picked up
+        too. A job is started while fewer than files_in_flight jobs of at least
+        its priority are running unpaused, so an urgent file does not wait for
+        the files already running, and a paused job frees its slot. Files are pipelined: text extraction and chunking run in a process
+        pool while chunks of other files are already being sent to the API
+        through one shared, priority-aware pool of request threads.
+        Returns a dict mapping each file path to its final status.
+        """
+        results = {}
+        # Files waiting on the API hold no CPU, so keep as many in flight as request workers;
+        # this also lets small chunks of different files share packed requests
+        files_in_flight = max(1, self.ingest_workers, self.max_workers)
+        self.stop_event.clear()
+        queued = self.job_queue.queued_jobs(job_ids)
+        total_files = len(queued)
+        self.emit("status", text=f"Processing {total_files} files")
+        self.emit("progress", value=0)
+        self.metrics.start_job(files=total_files, format=", ".join(sorted({job.target_format for job in queued})))
+        pruned_formats = set()
+        if self.dedup_index:
+            self.dedup_index.prune_missing()
+        if self.shard_writer:
+            self.log(f"Writing {self.shard_writer.compression} shards of up to {format_file_size(self.shard_writer.max_bytes)} to {self.converted_dir}")
+        
+        # Extraction workers are only spawned as files are submitted
+        extract_pool = ProcessPoolExecutor(
+            max_workers=max(1, self.ingest_workers),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        self.dispatch_pool = RequestScheduler(self.max_workers, self.job_max_in_flight)
+        self.router.set_pool_size(self.max_workers)
+        self.extract_pool = extract_pool
+        # Worker processes only start once a scanned page is submitted
+        if self.ocr_enabled:
+            self.ocr_pool = ProcessPoolExecutor(
+                max_workers=self.ocr_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        running = {}
+        
+        def admit(job):
+            # Paused jobs give up their slot, and jobs of lower priority do not hold one against this job
+            return sum(1 for other in running.values() if not other.paused and other.priority >= job.priority) < files_in_flight
+        
+        try:
+            # A thread per running file, as paused ones keep theirs without holding a slot
+            with ThreadPoolExecutor(max_workers=FILE_THREADS) as file_pool:
+                while True:
+                    while not self.stop_event.is_set():
+                        job = self.job_queue.take(job_ids, admit)
+                        if job is None:
+                            break
+                        self.metrics.observe("queue_wait", time.time() - job.added)
+                        if self.chunk_indexes is not None and job.target_format not in pruned_formats:
+                            self.chunk_index(job.target_format).prune_missing()
+                            pruned_formats.add(job.target_format)
+                        running[file_pool.submit(self.process_file, job.file_path, job.target_format, job)] = job
+                    if not running:
+                        break
+                    # Wake up now and then to start jobs queued in the meantime
+                    done, _ = wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job = running.pop(future)
+                        file_path = job.file_path
+                        try:
+                            if future.result() == 0:
+                                # Every record repeats content converted before
+                                self.log(f"Skipped {Path(file_path).name}: no new records, its content was already converted")
+                                self.metrics.incr("files_skipped")
+                                status = "Skipped"
+                            else:
+                                self.metrics.incr("files_completed")
+                                status = "Completed"
+                            
+                        except Exception as e:
+                            if self.stop_event.is_set():
+                                # Stopped files are not errors, they can be started again later
+                                self.log(f"Stopped {Path(file_path).name}")
+                                self.metrics.incr("files_stopped")
+                                status = "Stopped"
+                            elif job.cancelled:
+                                self.log(f"Cancelled {Path(file_path).name}")
+                                self.metrics.incr("files_cancelled")
+                                status = "Cancelled"
+                            else:
+                                error_msg = f"Error processing {Path(file_path).name}: {str(e)}"
+                                self.log(error_msg)
+                                self.metrics.incr("files_failed")
+                                status = "Failed"
+                                self.emit("file_error", file_path=file_path, message=error_msg, job_id=job.id)
+                        
+                        results[file_path] = status
+                        self.job_queue.finish(job.id, status)
+                        self.emit("file_status", file_path=file_path, status=status, job_id=job.id)
+                        
+                        # Update progress for file completion
+                        total_files = len(results) + len(running) + len(self.job_queue.queued_jobs(job_ids))
+                        self.emit("status", text=f"Processed {len(results)}/{total_files} files")
+                        self.emit("progress", value=len(results) / total_files * 100)
+        finally:
+            self.dispatch_pool.shutdown(cancel_futures=True)
+            extract_pool.shutdown(cancel_futures=True)
+            if self.ocr_pool:
+                self.ocr_pool.shutdown(cancel_futures=True)
+            self.dispatch_pool = None
+            self.extract_pool = None
+            self.ocr_pool = None
+            if self.shard_writer:
+                self.shard_writer.close()
+        
+        if self.stop_event.is_set():
+            # Jobs not started yet are stopped too, starting again queues them again
+            for job in self.job_queue.queued_jobs(job_ids):
+                self.job_queue.finish(job.id, "Stopped")
+                results[job.file_path] = "Stopped"
+                self.metrics.incr("files_stopped")
+                self.emit("file_status", file_path=job.file_path, status="Stopped", job_id=job.id)
+            self.emit("status", text="Processing Stopped")
+            self.log(f"Stopped after {sum(1 for status in results.values() if status == 'Completed')}/{len(results)} files")
+        else:
+            self.emit("status", text="Processing Complete")
+            self.log("All files processed")
+        self.report_metrics(self.metrics.finish_job())
+        self.emit("finished", results=results)
+        return results
+        
+    def process_file(self, file_path, target_format, job=None):
+        """Convert a file part by part and return the number of records written (None when resumed)"""
+        if self.stop_event.is_set():
+            raise RequestCancelled(f"{Path(file_path).name} not started, the job was stopped")
+        self.log(f"Starting to process file: {Path(file_path).name}")
+        self.emit("file_status", file_path=file_path, status="Paused" if job and job.paused else "Processing",
+                  job_id=job.id if job else None)
+        
+        # Save original file
+        dest_path = self.remaining_dir / Path(file_path).name
+        if Path(file_path).resolve() != dest_path.resolve():
+            shutil.copy2(file_path, dest_path)
+            self.log(f"Saved original file to: {dest_path}")
+        
+        # Journal of finished chunks and parts, used to resume interrupted jobs
+        journal = JobJournal.for_file(self.checkpoint_dir, file_path, target_format)
+        if journal.has_progress:
+            finished_chunks = sum(len(chunks) for chunks in journal.chunks.values())
+            self.log(f"Resuming previous job: {len(journal.parts)} parts and {finished_chunks} chunks already done")
+        
+        parts = []
+        records = 0
+        resumed = False
+        for part_name, start, end, scanned_pages in self.plan_parts(file_path):
+            if journal.is_part_done(part_name):
+                self.log(f"Skipping {part_name}, already converted in a previous run")
+                resumed = True
+            else:
+                parts.append((part_name, start, end, scanned_pages))
+        
+        # Scanned pages of every part are OCR'd up front, spread over the whole OCR pool
+        ocr_futures = [self.submit_ocr(file_path, scanned_pages) for _, _, _, scanned_pages in parts]
+        
+        # Extract the next part in the background while the current one is being converted
+        pending = deque()
+        next_part = 0
+        try:
+            while next_part < len(parts) or pending:
+                while next_part < len(parts) and len(pending) < 2:
+                    part_name, start, end, _ = parts[next_part]
+                    future = self.submit_extraction(file_path, start, end, ocr_futures[next_part])
+                    pending.append((part_name, (start, end), future))
+                    next_part += 1
+                
+                part_name, span, future = pending.popleft()
+                if job and job.cancelled:
+                    raise RequestCancelled(f"{Path(file_path).name} was cancelled before {part_name}")
+                with self.metrics.time("extract_wait"):
+                    content_chunks, extract_seconds, furniture_lines = future.result()
+                self.metrics.observe("extract", extract_seconds, part=part_name)
+                if furniture_lines:
+                    self.metrics.incr("furniture_lines", furniture_lines)
+                self.log(f"Extracted {part_name}: {len(content_chunks)} chunks ({furniture_lines} repeated header/footer lines stripped)")
+                records += self.convert_part(content_chunks, part_name, target_format, journal, file_path, span, job)
+        finally:
+            for _, _, future in pending:
+                future.cancel()
+            for futures in ocr_futures:
+                for future in futures:
+                    future.cancel()
+        
+        journal.finish()
+        return None if resumed else records
+        
+    def plan_parts(self, file_path, max_size_mb=10, ocr_page_tokens=500):
+        """Return the (part_name, start, end, scanned_pages) work units of a file.
+
+        PDFs are split into page ranges holding about pdf_part_tokens of text
+        each, balanced so parts take about as long; scanned pages to OCR count
+        as ocr_page_tokens. CSVs over max_size_mb are split at row byte offsets.
+        """
+        if file_path.lower().endswith('.csv') and Path(file_path).stat().st_size > max_size_mb * 1024 * 1024:
+            offsets = csv_part_offsets(file_path, max_size_mb * 1024 * 1024)
+            self.log(f"Large CSV detected, splitting it into {len(offsets)} parts of about {max_size_mb} MB")
+            return [
+                (f"{Path(file_path).stem}_part_{number}.csv", start, end, [])
+                for number, (start, end) in enumerate(zip(offsets, offsets[1:] + [None]), 1)
+            ]
+        if not file_path.lower().endswith('.pdf'):
+            return [(Path(file_path).name, None, None, [])]
+        
+        # Profiling the pages is done in a worker process like the extraction itself
+        if self.extract_pool is None:
+            page_chars, scanned = profile_pdf(file_path)
+        else:
+            page_chars, scanned = self.extract_pool.submit(profile_pdf, file_path).result()
+        if scanned and not self.ocr_enabled:
+            self.metrics.incr("pages_without_text", len(scanned))
+            self.log(f"{len(scanned)} pages of {Path(file_path).name} have no text layer and are skipped (install tesseract to OCR them)")
+            scanned = []
+        
+        scanned_set = set(scanned)
+        weights = [ocr_page_tokens if page in scanned_set else chars // 4 for page, chars in enumerate(page_chars)]
+        ranges = balanced_ranges(weights, self.pdf_part_tokens)
+        self.log(
+            f"PDF file detected, splitting {len(page_chars)} pages (about {sum(weights)} tokens, {len(scanned)} to OCR) "
+            f"into {len(ranges)} parts of about {sum(weights) // len(ranges)} tokens"
+        )
+        return [
+            (f"{Path(file_path).stem}_part_{start+1}.pdf", start, end, [page for page in scanned if start <= page < end])
+            for start, end in ranges
+        ]
+        
+    def submit_ocr(self, file_path, pages, batch_pages=4):
+        """OCR scanned pages in small batches, so the OCR pool works on many of them at once"""
+        batches = [pages[i:i + batch_pages] for i in range(0, len(pages), batch_pages)]
+        if self.ocr_pool is None:
+            futures = []
+            for batch in batches:
+                future = Future()
+                future.set_result(ocr_pages(file_path, batch, self.ocr_language, self.ocr_dpi))
+                futures.append(future)
+            return futures
+        return [
+            self.ocr_pool.submit(ocr_pages, file_path, batch, self.ocr_language, self.ocr_dpi)
+            for batch in batches
+        ]
+        
+    def submit_extraction(self, file_path, start=None, end=None, ocr_futures=()):
+        """Extract and chunk a file (or page range) in the process pool when one is running.
+
+        With OCR futures, extraction is submitted once the text of those pages is back.
+        """
+        if ocr_futures:
+            return self.extract_after_ocr(file_path, start, end, ocr_futures)
+        return self.submit_extract_chunks(file_path, start, end)
+        
+    def submit_extract_chunks(self, file_path, start, end, ocr_text=None):
+        if self.extract_pool is None:
+            future = Future()
+            future.set_result(extract_chunks(file_path, self.chunker, start, end, ocr_text))
+            return future
+        return self.extract_pool.submit(extract_chunks, file_path, self.chunker, start, end, ocr_text)
+        
+    def extract_after_ocr(self, file_path, start, end, ocr_futures):
+        result = Future()
+        remaining = [len(ocr_futures)]
+        lock = threading.Lock()
+        
+        def settle(future):
+            # Pass the extraction's outcome on, unless the part was cancelled meanwhile
+            try:
+                if future.cancelled():
+                    result.cancel()
+                elif future.exception() is not None:
+                    result.set_exception(future.exception())
+                else:
+                    result.set_result(future.result())
+            except InvalidStateError:
+                pass
+        
+        def ocr_done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            if result.cancelled():
+                return
+            try:
+                ocr_text = {}
+                for future in ocr_futures:
+                    texts, seconds, failed = future.result()
+                    ocr_text.update(texts)
+                    self.metrics.observe("ocr", seconds)
+                    self.metrics.incr("ocr_pages", len(texts))
+                    if failed:
+                        self.metrics.incr("ocr_failures", failed)
+                        self.log(f"OCR failed on {failed} pages of {Path(file_path).name}")
+                self.submit_extract_chunks(file_path, start, end, ocr_text).add_done_callback(settle)
+            except Exception as e:
+                try:
+                    result.set_exception(e)
+                except InvalidStateError:
+                    pass
+        
+        for future in ocr_futures:
+            future.add_done_callback(ocr_done)
+        return result
+        
+    def convert_part(self, content_chunks, part_name, target_format, journal=None, source=None, span=None, job=None):
+        """Convert the chunks of one part, streaming the records into its output file (or the shards).
+
+        Returns the number of records written.
+        """
+        try:
+            self.log(f"Converting {part_name} to format: {target_format}")
+            
+            if self.shard_writer:
+                # The part's blocks only count once it commits; a resumed part writes a new run that replaces them
+                part_key = f"{journal.path.stem}/{part_name}" if journal else part_name
+                unit = "pages" if part_name.lower().endswith(".pdf") else "bytes" if span and span[0] is not None else None
+                sink = self.shard_writer.open_part(
+                    part_key, target_format, source=str(source) if source else None, part=part_name,
+                    span=span, unit=unit, dedup=self.dedup_index, origin=Path(source).resolve() if source else None
+                )
+                output_path = self.shard_writer.manifest_path
+                self.log(f"Writing converted records to shards in: {self.converted_dir}")
+            else:
+                # A resumed part rewrites the same output file instead of leaving a partial one behind
+                output_path = Path(journal.part_output(part_name)) if journal and journal.part_output(part_name) else None
+                if output_path is None:
+                    output_path = self.converted_dir / f"{Path(part_name).stem}_{uuid.uuid4().hex[:6]}{self.get_extension(target_format)}"
+                    if journal:
+                        journal.record_part_output(part_name, output_path)
+                self.log(f"Writing converted records to: {output_path}")
+                sink = open_sink(output_path, target_format, dedup=self.dedup_index,
+                                 origin=Path(source).resolve() if source else None)
+            
+            # Content converted before, in this job or an earlier one, is not sent again
+            repeated = None
+            if self.chunk_indexes is not None:
+                repeated = self.find_repeated_chunks(content_chunks, target_format, sink.source, source)
+            
+            # Generate conversion using AI, records are appended as each chunk returns
+            checkpoint = journal.part(part_name) if journal else None
+            try:
+                self.emit("output", path=output_path)
+                self.convert_chunks(content_chunks, target_format, checkpoint, sink, job, repeated)
+                sink.commit()
+                if repeated is not None:
+                    self.remember_chunks(content_chunks, repeated, target_format, sink.source, source)
+            except BaseException:
+                # Chunks of a failed, stopped or cancelled part were never converted
+                if repeated is not None:
+                    self.chunk_index(target_format).forget(sink.source)
+                raise
+            finally:
+                sink.close()
+                self.metrics.incr("records_written", sink.records_written)
+                for kind, count in sink.duplicates.items():
+                    if count:
+                        self.metrics.incr("duplicates", count, kind=kind)
+            duplicates = sum(sink.duplicates.values())
+            self.log(f"Successfully converted: {output_path.name} ({sink.records_written} records, {duplicates} duplicates dropped)")
+            if not sink.records_written and not self.shard_writer:
+                # Nothing new came out of this part, so no empty file is left behind
+                output_path.unlink(missing_ok=True)
+                self.log(f"Removed {output_path.name}, it holds no records")
+            
+            if journal:
+                journal.record_part(part_name, output_path)
+            
+            if sink.records_written or self.shard_writer:
+                self.emit("output", path=output_path)
+            return sink.records_written
+            
+        except Exception as e:
+            error_msg = f"Conversion Error for {part_name}: {str(e)}"
+            self.log(error_msg)
+            raise Exception(error_msg)
+        
+    def convert_chunks(self, content_chunks, target_format, checkpoint, sink, job=None, repeated=None):
+        """Convert chunks concurrently and write them to the sink in their original order.
+
+        Chunks of a job are sent in its turn, within its in-flight cap, and
+        not at all once it is cancelled. Chunks in `repeated` (see
+        find_repeated_chunks) are not sent.
+        """
+        if not self.router.backends:
+            raise Exception("No API keys configured")
+        
+        # Prepare system message based on format
+        system_message = self.get_system_message(target_format)
+        parser = create_parser(target_format)
+        
+        cache_before = self.response_cache.stats()
+        converted_chunks = [None] * len(content_chunks)
+        next_to_write = 0
+        
+        repeated = repeated or {}
+        
+        # Records of chunks still streaming in: [records received, how many of them are written]
+        streamed = {}
+        write_lock = threading.Lock()
+        
+        def write_ready_chunks():
+            # Write every chunk that is next in line, then drop it from memory. The records
+            # of the first unfinished chunk are written as soon as they stream in.
+            nonlocal next_to_write
+            with write_lock:
+                while next_to_write < len(converted_chunks):
+                    received, written = streamed.get(next_to_write, ((), 0))
+                    records = converted_chunks[next_to_write]
+                    if records is None:
+                        if len(received) > written:
+                            with self.metrics.time("write"):
+                                sink.write_partial(received[written:])
+                            streamed[next_to_write][1] = len(received)
+                        break
+                    streamed.pop(next_to_write, None)
+                    with self.metrics.time("write"):
+                        sink.write_chunk(records[written:])
+                    converted_chunks[next_to_write] = WRITTEN
+                    next_to_write += 1
+        
+        def on_records(chunk_index, records):
+            with write_lock:
+                streamed.setdefault(chunk_index, [[], 0])[0].extend(records)
+            if chunk_index == next_to_write:
+                write_ready_chunks()
+        
+        # Reuse chunks finished by an earlier, interrupted run
+        if checkpoint:
+            for chunk_index, chunk in enumerate(content_chunks):
+                converted = checkpoint.get(chunk_index, chunk)
+                if converted is not None:
+                    converted_chunks[chunk_index] = parser.parse(converted).records
+            resumed = sum(1 for converted in converted_chunks if converted is not None)
+            if resumed:
+                self.log(f"Resuming from checkpoint: {resumed}/{len(content_chunks)} chunks already done")
+        
+        skipped = [chunk_index for chunk_index in repeated if converted_chunks[chunk_index] is None]
+        for chunk_index in skipped:
+            converted_chunks[chunk_index] = []
+            self.metrics.incr("chunks_skipped", kind=repeated[chunk_index])
+        if skipped and len(skipped) == len(content_chunks):
+            duplicate_of = self.chunk_index(target_format).source_of(content_chunks[skipped[0]])
+            self.log(f"Skipping all {len(skipped)} chunks: duplicate of {duplicate_of or 'content already converted'}")
+        elif skipped:
+            self.log(f"Skipping {len(skipped)}/{len(content_chunks)} chunks that repeat content already converted")
+        
+        # Keep several requests in flight, spread across all API keys. During run_jobs the
+        # request threads are shared by all jobs, otherwise a pool is made for this call.
+        own_executor = self.dispatch_pool is None
+        if own_executor:
+            executor = pack_executor = ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(content_chunks))))
+        else:
+            executor = self.dispatch_pool.for_job(job)
+            # Packed requests mix chunks of several jobs, so they are not held back by any one of them;
+            # convert_packed hands chunks of paused or cancelled jobs back to their own job
+            pack_executor = self.dispatch_pool.for_job(None)
+        cancel = job.cancel_event if job else self.stop_event
+        self.log(f"Dispatching {len(content_chunks)} chunks across {self.router.describe()}")
+        
+        futures = {}
+        failed = 0
+        for chunk_index, chunk in enumerate(content_chunks):
+            if converted_chunks[chunk_index] is not None:
+                continue
+            item = (chunk, chunk_index, len(content_chunks), system_message, target_format)
+            tokens = self.count_tokens(chunk) if self.packer else 0
+            if self.packer and tokens <= self.packer.max_tokens // 2:
+                future = self.pack_chunk(item, tokens, pack_executor, job)
+            elif self.stream_responses:
+                future = executor.submit(self.convert_chunk, *item, on_records=partial(on_records, chunk_index), cancel=cancel)
+            else:
+                future = executor.submit(self.convert_chunk, *item, cancel=cancel)
+            futures[future] = chunk_index
+        try:
+            write_ready_chunks()
+            for future in as_completed(futures):
+                # Store results by chunk index so the original order is kept
+                chunk_index = futures[future]
+                converted, converted_chunks[chunk_index] = future.result()
+                if converted is None:
+                    # Not journaled, so running the file again asks for it again
+                    failed += 1
+                elif checkpoint:
+                    checkpoint.record(chunk_index, content_chunks[chunk_index], converted)
+                write_ready_chunks()
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            if own_executor:
+                executor.shutdown()
+        
+        cache_after = self.response_cache.stats()
+        self.log(
+            f"Response cache: {cache_after['hits'] - cache_before['hits']} hits, "
+            f"{cache_after['misses'] - cache_before['misses']} misses "
+            f"({format_file_size(cache_after['bytes'])} stored)"
+        )
+        if failed:
+            raise Exception(f"{failed}/{len(content_chunks)} chunks could not be converted, process the file again to retry them")
+        self.log("All chunks processed successfully")
+        
+    def chunk_index(self, target_format):
+        """Dedup index of the input chunks converted into target_format"""
+        with self.lock:
+            index = self.chunk_indexes.get(target_format)
+            if index is None:
+                name = re.sub(r"\W+", "_", target_format.lower()).strip("_")
+                index = DedupIndex(self.cache_dir / "chunks" / f"{name}.sqlite3", threshold=self.chunk_dedup_threshold)
+                self.chunk_indexes[target_format] = index
+            return index
+        
+    def find_repeated_chunks(self, content_chunks, target_format, source, input_path=None):
+        """Map the indexes of identical or near-identical chunks to "exact" or "near".
+
+        Chunks repeat either an earlier chunk of the same part or a chunk that
+        remember_chunks registered once its part was converted. Chunks converted
+        from the same input file by an earlier run do not count, so converting
+        a file again converts it in full.
+        """
+        index = self.chunk_index(target_format)
+        index.forget(source)
+        origin = Path(input_path).resolve() if input_path else None
+        # Repeats inside the part are found in a scratch index, nothing is registered before the part commits
+        part_index = DedupIndex(":memory:", threshold=self.chunk_dedup_threshold)
+        repeated = {}
+        try:
+            for chunk_index, chunk in enumerate(content_chunks):
+                duplicate = index.check(chunk, source, origin, remember=False) or part_index.check(chunk, source)
+                if duplicate:
+                    repeated[chunk_index] = duplicate
+        finally:
+            part_index.close()
+        return repeated
+        
+    def remember_chunks(self, content_chunks, repeated, target_format, source, input_path=None):
+        """Register the converted chunks of a committed part, under the output they went to"""
+        index = self.chunk_index(target_format)
+        origin = Path(input_path).resolve() if input_path else None
+        for chunk_index, chunk in enumerate(content_chunks):
+            if chunk_index not in repeated:
+                index.check(chunk, source, origin)
+        index.commit()
+        
+    def chunk_messages(self, chunk, system_message, target_format):
+        return [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": f"Convert this content into {target_format}. Content: {chunk}"}
+        ]
+        
+    def chunk_payload(self, messages, max_tokens=1500):
+        # The model is set by the backend the request is routed to
+        return {
+            "messages": messages,
+            "temperature": 0.1,
+            "top_p": 0.1,
+            "max_tokens": max_tokens,
+            "presence_penalty": 0,
+            "frequency_penalty": 0
+        }
+        
+    def convert_chunk(self, chunk, chunk_index, total_chunks, system_message, target_format, on_records=None,
+                      cancel=None, cache_checked=False):
+        """Send a single chunk to the API and return its response text and validated records.
+
+        A response without any valid record is re-requested, up to
+        max_validation_retries times, telling the model what went wrong. A chunk
+        given up on (no valid records, or no answer within chunk_deadline seconds
+        of sending it) returns None as its text. When responses are streamed,
+        on_records receives each record as soon as it is complete; the records
+        returned start with those. Setting `cancel` (the job's token, by default
+        the engine's stop event) aborts the request. cache_checked skips the
+        cache lookup of the first attempt, already made (and counted) by pack_chunk.
+        """
+        parser = create_parser(target_format)
+        label = f"chunk {chunk_index + 1}/{total_chunks}"
+        messages = self.chunk_messages(chunk, system_message, target_format)
+        for attempt in range(self.max_validation_retries + 1):
+            data = self.chunk_payload(messages)
+            stream = StreamingParser(target_format) if on_records else None
+            on_text = None
+            if stream:
+                def on_text(text):
+                    records = stream.feed(text)
+                    if records:
+                        on_records(records)
+            lookup = not (cache_checked and attempt == 0)
+            try:
+                # The router skips the API entirely if this exact request was answered before
+                response_data = self.router.complete(
+                    data, label=label, on_text=on_text, cancel=cancel or self.stop_event,
+                    time_limit=self.chunk_deadline or None, cache=self.response_cache if lookup else None
+                )
+            except RequestCancelled as e:
+                if e.reason != "deadline":
+                    raise
+                # Nothing arrived in time, give up on this chunk only
+                self.metrics.incr("chunks")
+                self.metrics.incr("deadline_chunks")
+                self.log(f"Skipping {label}: no answer within {self.chunk_deadline:.0f}s")
+                return None, []
+            choice = response_data["choices"][0]
+            converted = choice["message"]["content"]
+            finish_reason = choice.get("finish_reason")
+            if response_data.get("cached"):
+                self.metrics.incr("cache_hits")
+                self.log(f"Chunk {chunk_index + 1}/{total_chunks} served from cache")
+            elif lookup:
+                self.metrics.incr("cache_misses")
+            
+            with self.metrics.time("parse"):
+                result = stream.finish(converted) if stream else parser.parse(converted)
+            if result.invalid:
+                self.metrics.incr("invalid_records", result.invalid)
+            if result.ok:
+                # Only complete responses that passed validation are cached, under the model that gave them
+                if finish_reason in ("deadline", "interrupted"):
+                    self.log(f"{label} was cut off ({finish_reason}), keeping the {len(result.records)} records received")
+                elif not response_data.get("cached"):
+                    self.response_cache.put(self.response_cache.make_key(dict(data, model=response_data["backend_model"])), converted)
+                self.metrics.incr("chunks")
+                self.log(f"Successfully processed chunk {chunk_index + 1} ({len(result.records)} records)")
+                return converted, result.records
+            
+            if finish_reason == "deadline":
+                self.metrics.incr("chunks")
+                self.metrics.incr("deadline_chunks")
+                self.log(f"Skipping {label}: no valid records within {self.chunk_deadline:.0f}s")
+                return None, []
+            if attempt < self.max_validation_retries and finish_reason == "interrupted":
+                continue  # The connection broke before any record arrived, ask the same again
+            if attempt < self.max_validation_retries:
+                self.metrics.incr("validation_retries")
+                self.log(f"No valid {target_format} records in {label}, re-requesting it")
+                messages = messages[:2] + [
+                    {"role": "assistant", "content": converted},
+                    {"role": "user", "content": f"That answer could not be parsed as {target_format}. {format_instructions(target_format)}"}
+                ]
+        
+        # Give up on this chunk only, the rest of the file is still converted and then reported as failed
+        self.metrics.incr("chunks")
+        self.metrics.incr("invalid_chunks")
+        self.log(f"Skipping {label}: no valid {target_format} records after {self.max_validation_retries + 1} attempts")
+        return None, []
+        
+    def pack_chunk(self, item, tokens, executor, job=None):
+        """Queue a small chunk (of `job`) for a packed request, unless its answer is already cached"""
+        chunk, chunk_index, total_chunks, system_message, target_format = item
+        data = self.chunk_payload(self.chunk_messages(chunk, system_message, target_format))
+        cached = self.router.cached(data, self.response_cache)
+        if cached is not None:
+            result = create_parser(target_format).parse(cached)
+            if result.ok:
+                self.metrics.incr("cache_hits")
+                self.metrics.incr("chunks")
+                self.log(f"Chunk {chunk_index + 1}/{total_chunks} served from cache")
+                future = Future()
+                future.set_result((cached, result.records))
+                return future
+        self.metrics.incr("cache_misses")
+        return self.packer.add(target_format, (item, job), tokens, executor)
+        
+    def convert_packed(self, batch):
+        """Send a batch of small chunks as one request and split the answer back per chunk.
+
+        Chunks whose section is missing or has no valid records are sent again on their own,
+        as are chunks of jobs paused or cancelled while the batch was filling up.
+        """
+        ready = []
+        for (item, job), future in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            if job is not None and (job.paused or job.cancelled):
+                # Sent in the job's own turn once it is resumed, or failed at once if it was cancelled
+                try:
+                    self.chain(self.dispatch_pool.for_job(job).submit(
+                        self.convert_chunk, *item, cancel=job.cancel_event, cache_checked=True
+                    ), future)
+                except RuntimeError as e:
+                    future.set_exception(e)
+            else:
+                ready.append((item, job, future))
+        if len(ready) == 1:
+            item, job, future = ready[0]
+            try:
+                future.set_result(self.convert_chunk(*item, cancel=job.cancel_event if job else None, cache_checked=True))
+            except Exception as e:
+                future.set_exception(e)
+            return
+        if not ready:
+            return
+        
+        # The shared request is only cut once every job in it is cancelled, or on stop
+        jobs = [job for _, job, _ in ready]
+        cancel = SharedCancel(self.stop_event, jobs) if None not in jobs else self.stop_event
+        batch = [(item, future) for item, _, future in ready]
+        _, _, _, system_message, target_format = batch[0][0]
+        parser = create_parser(target_format)
+        chunks = [item[0] for item, _ in batch]
+        tag = new_tag()
+        messages = [
+            {"role": "system", "content": f"{system_message}\n{PACK_INSTRUCTIONS}"},
+            {"role": "user", "content": f"Convert each section of this content into {target_format}.\n\n{pack_sections(chunks, tag)}"}
+        ]
+        data = self.chunk_payload(messages, max_tokens=min(self.pack_max_output_tokens, 1500 * len(batch)))
+        try:
+            response_data = self.router.complete(data, label=f"{len(batch)} packed chunks", cancel=cancel)
+            sections = split_sections(response_data["choices"][0]["message"]["content"], len(batch), tag)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        if not any(sections):
+            self.log(f"Packed answer does not hold the markers of its {len(batch)} sections, sending them on their own")
+        self.metrics.incr("packed_requests")
+        
+        fallbacks = []
+        for (item, job, future), section in zip(ready, sections):
+            chunk, chunk_index, total_chunks, system_message, target_format = item
+            with self.metrics.time("parse"):
+                result = parser.parse(section) if section else None
+            if result is not None and result.invalid:
+                self.metrics.incr("invalid_records", result.invalid)
+            if result is None or not result.ok:
+                fallbacks.append((item, job, future))
+                continue
+            # Cached under the single-chunk request, so later runs hit it with or without packing
+            single = self.chunk_payload(self.chunk_messages(chunk, system_message, target_format))
+            single["model"] = response_data["backend_model"]
+            self.response_cache.put(self.response_cache.make_key(single), section)
+            self.metrics.incr("chunks")
+            self.metrics.incr("packed_chunks")
+            future.set_result((section, result.records))
+        self.log(f"Packed request answered {len(batch) - len(fallbacks)}/{len(batch)} chunks")
+        
+        for item, job, future in fallbacks:
+            self.metrics.incr("pack_fallbacks")
+            self.log(f"Sending chunk {item[1] + 1}/{item[2]} on its own, its packed section was unusable")
+            try:
+                future.set_result(self.convert_chunk(*item, cancel=job.cancel_event if job else None, cache_checked=True))
+            except Exception as e:
+                future.set_exception(e)
+        
+    @staticmethod
+    def chain(source, target):
+        """Settle the running future `target` with the outcome of `source` once it is done"""
+        def settle(source):
+            if source.cancelled():
+                target.set_exception(RequestCancelled("the request was cancelled"))
+            elif source.exception() is not None:
+                target.set_exception(source.exception())
+            else:
+                target.set_result(source.result())
+        source.add_done_callback(settle)
+        
+    def get_system_message(self, target_format):
+        """Get appropriate system message based on format"""
+        base_message = "You are a data formatting expert. Your task is to convert the given content into the specified format while preserving the important information."
+        
+        format_specific = {
+            "Alpaca Format": """Format the content into clear instruction-input-output JSON format. Each section should be concise and meaningful.
+                Structure: {"instruction": "...", "input": "...", "output": "..."}""",
+            "Prompt-Completion Format": """Create natural prompt-completion pairs from the content.
+                Structure: {"prompt": "...", "completion": "..."}""",
+            "Chat Format": """Convert content into a flowing conversation format.
+                Structure: {"messages": [{"role": "system"/"user"/"assistant", "content": "..."}]}""",
+            "Q/A Format": """Extract key questions and answers from the content.
+                Structure: {"question": "...", "answer": "..."}""",
+            "Instruction-Context-Response Format": """Create instruction-context-response triples from the content.
+                Structure: {"instruction": "...", "context": "...", "response": "..."}""",
+            "JSONL": """Create JSONL format with text and summary for each logical section.
+                Structure: {"text": "...", "summary": "..."}""",
+            "CSV": """Convert content into CSV format with relevant columns.""",
+            "Table Format": """Create a structured table with appropriate headers and data rows."""
+        }
+        
+        return f"{base_message}\n\n{format_specific.get(target_format, '')}\n{format_instructions(target_format)}"
+        
+    def get_extension(self, format_name):
+        format_extensions = {
+            "JSONL": ".jsonl",
+            "CSV": ".csv",
+            "Table Format": ".csv",
+        }
+        return format_extensions.get(format_name, ".txt")
@@ -0,0 +1,289 @@
+import io
+import json
+import os
+import re
+import shutil
+import time
+from bisect import bisect_left
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+
+# PyMuPDF (fitz) and pandas are imported where they are used, so a job
+# without PDFs or CSVs never pays for loading them
+
+DIGITS = re.compile(r"\d+")
+
+
+def iter_pdf_pages(doc, start=0, end=None, ocr_text=None):
+    """Yield the text of pages [start, end) of an already open fitz document one page at a time.
+
+    Pages found in ocr_text (page number -> text) use that text instead of their text layer.
+    """
+    end = doc.page_count if end is None else min(end, doc.page_count)
+    for page_number in range(start, end):
+        if ocr_text and page_number in ocr_text:
+            text = ocr_text[page_number]
+        else:
+            text = doc.load_page(page_number).get_text()
+        # A form feed marks the page boundary for the chunker
+        yield text + "\f"
+
+
+def profile_pdf(file_path, sample_pages=16):
+    """Estimated characters of text on every page, and the pages that look scanned (images but no text layer).
+
+    A page without fonts has no text layer. Only a sample of the other pages
+    has its text extracted; the rest are estimated from the size of their
+    content stream, so profiling does not extract the whole document twice.
+    """
+    import fitz
+    doc = fitz.open(file_path)
+    try:
+        page_chars = [0] * doc.page_count
+        content_sizes = {}
+        scanned = []
+        for page_number in range(doc.page_count):
+            page = doc.load_page(page_number)
+            if page.get_fonts():
+                content_sizes[page_number] = len(page.read_contents())
+            elif page.get_images():
+                scanned.append(page_number)
+
+        text_pages = list(content_sizes)
+        sample = text_pages[::max(1, -(-len(text_pages) // sample_pages))]
+        for page_number in sample:
+            page_chars[page_number] = len(doc.load_page(page_number).get_text().strip())
+        sample_bytes = sum(content_sizes[page_number] for page_number in sample)
+        chars_per_byte = sum(page_chars[page_number] for page_number in sample) / sample_bytes if sample_bytes else 0
+        for page_number in set(text_pages) - set(sample):
+            page_chars[page_number] = int(content_sizes[page_number] * chars_per_byte)
+        return page_chars, scanned
+    finally:
+        doc.close()
+
+
+def balanced_ranges(weights, target):
+    """Split items into contiguous [start, end) ranges of about `target` weight, all of nearly equal weight"""
+    total = sum(weights)
+    count = max(1, min(len(weights), -(-total // max(1, target))))
+    prefix = []
+    running = 0
+    for weight in weights:
+        running += weight
+        prefix.append(running)
+
+    bounds = [0]
+    for k in range(1, count):
+        # First item after which the running weight reaches k/count of the total
+        cut = bisect_left(prefix, total * k / count) + 1
+        if bounds[-1] < cut < len(weights):
+            bounds.append(cut)
+    bounds.append(len(weights))
+    return list(zip(bounds, bounds[1:]))
+
+
+def tesseract_installed():
+    """Whether scanned pages can be OCR'd, checked without loading PyMuPDF"""
+    return bool(os.getenv("TESSDATA_PREFIX") or shutil.which("tesseract"))
+
+
+@lru_cache(maxsize=None)
+def find_tessdata():
+    """Tesseract's language data directory, or None when tesseract is not installed.
+
+    Resolved once per OCR worker process, as asking PyMuPDF means importing it.
+    """
+    if os.getenv("TESSDATA_PREFIX"):
+        return os.getenv("TESSDATA_PREFIX")
+    if not shutil.which("tesseract"):
+        return None
+    import fitz
+    try:
+        return fitz.get_tessdata() or None
+    except Exception:
+        return None
+
+
+def ocr_pages(file_path, page_numbers, language="eng", dpi=300):
+    """OCR pages without a text layer with tesseract (through PyMuPDF).
+
+    Runs in the OCR worker processes. Returns the text of each page that could
+    be read, the seconds spent and the number of pages that failed.
+    """
+    started = time.perf_counter()
+    tessdata = find_tessdata()
+    if tessdata is None:
+        return {}, time.perf_counter() - started, len(page_numbers)
+    import fitz
+    texts = {}
+    failed = 0
+    doc = fitz.open(file_path)
+    try:
+        for page_number in page_numbers:
+            page = doc.load_page(page_number)
+            try:
+                textpage = page.get_textpage_ocr(language=language, dpi=dpi, full=True, tessdata=tessdata)
+                texts[page_number] = page.get_text(textpage=textpage)
+            except Exception:
+                failed += 1
+    finally:
+        doc.close()
+    return texts, time.perf_counter() - started, failed
+
+
+def furniture_key(line):
+    # Page numbers and dates change from page to page, so digits are masked
+    return DIGITS.sub("#", " ".join(line.split()).lower())
+
+
+def strip_page_furniture(pages, edge_lines=3, min_pages=3, min_share=0.5):
+    """Remove header and footer lines repeated at the top or bottom of most pages.
+
+    Returns the cleaned pages and the number of lines removed.
+    """
+    if len(pages) < min_pages:
+        return pages, 0
+    
+    counts = Counter()
+    for page in pages:
+        lines = [line for line in page.rstrip("\f").splitlines() if line.strip()]
+        counts.update({furniture_key(line) for line in lines[:edge_lines] + lines[-edge_lines:]})
+    furniture = {key for key, count in counts.items() if count >= max(min_pages, min_share * len(pages))}
+    if not furniture:
+        return pages, 0
+    
+    cleaned = []
+    removed = 0
+    for page in pages:
+        lines = page.rstrip("\f").split("\n")
+        nonblank = [index for index, line in enumerate(lines) if line.strip()]
+        edges = set(nonblank[:edge_lines] + nonblank[-edge_lines:])
+        kept = []
+        for index, line in enumerate(lines):
+            if index in edges and furniture_key(line) in furniture:
+                removed += 1
+            else:
+                kept.append(line)
+        cleaned.append("\n".join(kept) + "\f")
+    return cleaned, removed
+
+
+def iter_text_file(file_path, block_size=1024 * 1024):
+    with open(file_path, 'r', encoding='utf-8') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            yield block
+
+
+def read_pdf(file_path, chunker, start=None, end=None, ocr_text=None):
+    """Reader for PDFs: pages [start, end) are read straight from the document, no part PDFs are written"""
+    import fitz
+    doc = fitz.open(file_path)
+    try:
+        pages, furniture_lines = strip_page_furniture(list(iter_pdf_pages(doc, start or 0, end, ocr_text)))
+    finally:
+        doc.close()
+    return list(chunker.chunk(pages)), furniture_lines
+
+
+def read_csv(file_path, chunker, start=None, end=None, ocr_text=None):
+    """Reader for CSVs: rows are read in blocks and packed into row-aligned chunks that repeat the header"""
+    return list(chunker.chunk_table(iter_csv_blocks(file_path, start, end))), 0
+
+
+def read_json(file_path, chunker, start=None, end=None, ocr_text=None):
+    with open(file_path) as f:
+        return list(chunker.chunk([json.dumps(json.load(f), indent=2)])), 0
+
+
+def read_text(file_path, chunker, start=None, end=None, ocr_text=None):
+    """Reader for text files and any extension without a reader of its own"""
+    return list(chunker.chunk(iter_text_file(file_path))), 0
+
+
+def read_csv_row(f):
+    """Read one row of a CSV opened in binary mode, line breaks inside quoted cells included"""
+    row = f.readline()
+    while row.count(b'"') % 2:
+        line = f.readline()
+        if not line:
+            break
+        row += line
+    return row
+
+
+def csv_part_offsets(file_path, part_bytes, block_bytes=1 << 20):
+    """Byte offsets of row starts roughly part_bytes apart, the first one just after the header.
+
+    The file is scanned once, counting quotes, so a line break inside a quoted
+    cell is never taken for the end of a row.
+    """
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        read_csv_row(f)
+        offsets = [f.tell()]
+        position = f.tell()
+        next_split = position + part_bytes
+        in_quotes = False
+        while True:
+            block = f.read(block_bytes)
+            if not block:
+                break
+            start = 0
+            while start < len(block):
+                if position + start < next_split:
+                    # Before the next split only whether a quote is open matters
+                    stop = min(len(block), next_split - position)
+                else:
+                    newline = block.find(b'\n', start)
+                    stop = len(block) if newline < 0 else newline + 1
+                in_quotes ^= block.count(b'"', start, stop) % 2 == 1
+                if position + stop >= next_split and block[stop - 1:stop] == b'\n' and not in_quotes:
+                    if position + stop >= size:
+                        break
+                    offsets.append(position + stop)
+                    next_split = position + stop + part_bytes
+                start = stop
+            position += len(block)
+    return offsets
+
+
+def iter_csv_blocks(file_path, start=None, end=None, rows_per_read=20000):
+    """Yield (header, rows) blocks of a CSV as compact CSV lines, reading rows_per_read rows at a time.
+
+    With a byte range, only the rows in [start, end) are read (see csv_part_offsets).
+    """
+    source = file_path
+    if start is not None:
+        with open(file_path, 'rb') as f:
+            header = read_csv_row(f)
+            f.seek(start)
+            data = f.read(end - start) if end is not None else f.read()
+        source = io.BytesIO(header + data)
+    
+    import pandas as pd
+    reader = pd.read_csv(source, dtype=str, keep_default_na=False, encoding='utf-8-sig', chunksize=rows_per_read)
+    for block in reader:
+        # Line breaks inside cells would break the one-row-per-line layout
+        block = block.replace(r"[\r\n]+", " ", regex=True)
+        block.columns = [re.sub(r"[\r\n]+", " ", str(column)) for column in block.columns]
+        lines = block.to_csv(index=False, lineterminator="\n").split("\n")
+        yield lines[0], lines[1:-1]
+
+
+def iter_fixed_chunks(pieces, max_chunk_size):
+    """Re-slice a stream of text pieces into chunks of exactly max_chunk_size characters"""
+    buffer = ""
+    for piece in pieces:
+        # The carried-over buffer is always shorter than one chunk
+        buffer += piece
+        offset = 0
+        while len(buffer) - offset >= max_chunk_size:
+            yield buffer[offset:offset + max_chunk_size]
+            offset += max_chunk_size
+        buffer = buffer[offset:]
+    if buffer:
+        yield buffer
@@ -0,0 +1,124 @@
+"""Cold-start benchmark: how long the GUI and the headless CLI take to import.
+
+    python import_benchmark.py --repeat 5 --gui-budget-ms 400 --headless-budget-ms 250
+
+Every measurement runs in a fresh interpreter. The headless check imports the
+CLI and runs `dataset_generator.py convert --help`; the GUI check imports the
+GUI module and creates the conversion engine (without opening a window).
+Heavy dependencies (Tk, pandas, PyMuPDF, numpy, requests) must not be loaded
+by either until a job needs them. Exits with 1 when a budget is exceeded or
+a heavy module is imported at startup.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+HEAVY_MODULES = ["tkinter", "pandas", "fitz", "pymupdf", "numpy", "requests", "httpx"]
+
+HEADLESS_SNIPPET = """
+import json, sys, time
+started = time.perf_counter()
+import cli
+seconds = time.perf_counter() - started
+print(json.dumps({"seconds": seconds, "modules": sorted(sys.modules)}))
+"""
+
+GUI_SNIPPET = """
+import json, sys, time
+started = time.perf_counter()
+import dataset_generator
+engine = dataset_generator.ConversionEngine()
+seconds = time.perf_counter() - started
+print(json.dumps({"seconds": seconds, "modules": sorted(sys.modules)}))
+"""
+
+
+def run_snippet(snippet, work_dir):
+    """Run a snippet in a fresh interpreter, returning its import seconds and the modules it loaded"""
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    output = subprocess.run([sys.executable, "-c", snippet], cwd=work_dir, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def time_command(command, work_dir):
+    """Wall seconds of a whole process, interpreter start-up included"""
+    started = time.perf_counter()
+    subprocess.run(command, cwd=work_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - started
+
+
+def slowest_imports(snippet, work_dir, top=10):
+    """Modules with the largest cumulative import time, from -X importtime"""
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", snippet], cwd=work_dir, env=env,
+                            capture_output=True, text=True).stderr
+    timings = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        timings.append((int(cumulative), name.strip()))
+    return sorted(timings, reverse=True)[:top]
+
+
+def measure(name, snippet, allowed, budget_ms, repeat, work_dir, command=None):
+    runs = [run_snippet(snippet, work_dir) for _ in range(repeat)]
+    result = {
+        "check": name,
+        "import_ms": round(min(run["seconds"] for run in runs) * 1000, 1),
+        "budget_ms": budget_ms,
+        "heavy_modules": [module for module in HEAVY_MODULES
+                          if module in runs[0]["modules"] and module not in allowed]
+    }
+    if command:
+        result["process_ms"] = round(min(time_command(command, work_dir) for _ in range(repeat)) * 1000, 1)
+    result["ok"] = result["import_ms"] <= budget_ms and not result["heavy_modules"]
+    return result
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Measure GUI and headless cold-start import time")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per check; the best run counts")
+    parser.add_argument("--gui-budget-ms", type=float, default=400, help="Budget for the GUI import (default: 400)")
+    parser.add_argument("--headless-budget-ms", type=float, default=250,
+                        help="Budget for the headless import (default: 250)")
+    parser.add_argument("--top", type=int, default=0, help="Also list the N slowest imports of each check")
+    parser.add_argument("--json-output", default=None, help="Also write the results to this JSON file")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    results = []
+    # The engine creates its cache and log directories in the working directory
+    with tempfile.TemporaryDirectory(prefix="datagen-import-") as work_dir:
+        results.append(measure(
+            "headless", HEADLESS_SNIPPET, (), args.headless_budget_ms, args.repeat, work_dir,
+            command=[sys.executable, str(ROOT / "dataset_generator.py"), "convert", "--help"]
+        ))
+        results.append(measure("gui", GUI_SNIPPET, ("tkinter",), args.gui_budget_ms, args.repeat, work_dir))
+
+        for result, snippet in zip(results, (HEADLESS_SNIPPET, GUI_SNIPPET)):
+            process = f", whole process {result['process_ms']} ms" if "process_ms" in result else ""
+            status = "ok" if result["ok"] else "OVER BUDGET" if not result["heavy_modules"] else "HEAVY IMPORTS"
+            print(f"{result['check']}: {result['import_ms']} ms (budget {result['budget_ms']:g} ms{process}) - {status}")
+            if result["heavy_modules"]:
+                print(f"  loaded at startup: {', '.join(result['heavy_modules'])}")
+            for microseconds, module in slowest_imports(snippet, work_dir, args.top) if args.top else ():
+                print(f"  {microseconds / 1000:8.1f} ms  {module}")
+
+    if args.json_output:
+        Path(args.json_output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.json_output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return 0 if all(result["ok"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
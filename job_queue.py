@@ -0,0 +1,375 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future
+from itertools import count
+from pathlib import Path
+
+from api_client import RequestCancelled
+
+FINISHED = ("Completed", "Skipped", "Failed", "Cancelled")
+
+
+class Job:
+    """One file to convert into one format, with its priority and in-flight cap.
+
+    cancel_event is the job's cancellation token: it is checked before each of
+    its chunks is sent and handed to the API client to cut requests in flight.
+    resume_event is cleared while the job is paused, which holds back the
+    chunks not sent yet; requests already in flight finish.
+    """
+
+    def __init__(self, job_id, file_path, target_format, priority=0, max_in_flight=None, seq=0, status="Queued"):
+        self.id = job_id
+        self.file_path = file_path
+        self.target_format = target_format
+        self.priority = priority
+        self.max_in_flight = max_in_flight
+        self.seq = seq
+        self.status = status
+        self.added = time.time()
+        self.running = False
+        self.cancel_event = threading.Event()
+        self.resume_event = threading.Event()
+        self.resume_event.set()
+
+    @property
+    def paused(self):
+        return not self.resume_event.is_set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def to_record(self):
+        return {"event": "job", "id": self.id, "file_path": self.file_path, "target_format": self.target_format,
+                "priority": self.priority, "max_in_flight": self.max_in_flight, "seq": self.seq, "status": self.status}
+
+
+class JobQueue:
+    """Persistent priority queue of conversion jobs.
+
+    Jobs and every change to them are appended to a JSON lines file, so queued,
+    paused and stopped jobs survive a restart; jobs that were running are
+    queued again and resume from their checkpoints. Finished jobs are dropped
+    when the file is loaded. Higher priorities are taken first, then older jobs.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.load()
+        self.seq = count(max((job.seq for job in self.jobs.values()), default=-1) + 1)
+
+    def load(self):
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Last line may be cut short by a crash
+                    if record.get("event") == "job":
+                        self.jobs[record["id"]] = Job(
+                            record["id"], record["file_path"], record["target_format"], record["priority"],
+                            record["max_in_flight"], record["seq"], record["status"]
+                        )
+                    elif record["id"] in self.jobs:
+                        job = self.jobs[record["id"]]
+                        if record.get("event") == "status":
+                            job.status = record["status"]
+                        elif record.get("event") == "priority":
+                            job.priority = record["priority"]
+                        elif record.get("event") == "removed":
+                            del self.jobs[job.id]
+
+        for job in list(self.jobs.values()):
+            if job.status in FINISHED or job.status == "Cancelling" or not Path(job.file_path).exists():
+                del self.jobs[job.id]
+            elif job.status == "Processing":
+                job.status = "Queued"
+            elif job.status == "Paused":
+                job.resume_event.clear()
+        # Start from a compact file holding only the jobs still to do
+        temp_path = self.path.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for job in self.jobs.values():
+                f.write(json.dumps(job.to_record(), ensure_ascii=False) + "\n")
+        os.replace(temp_path, self.path)
+
+    def append(self, record):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def set_status_locked(self, job, status):
+        job.status = status
+        self.append({"event": "status", "id": job.id, "status": status})
+
+    def add(self, file_path, target_format, priority=0, max_in_flight=None):
+        """Queue a file, or return the unfinished job already converting it into this format"""
+        file_path = str(file_path)
+        with self.lock:
+            for job in self.jobs.values():
+                if job.file_path == file_path and job.target_format == target_format and job.status not in FINISHED:
+                    if not job.running:
+                        job.priority = priority
+                        job.max_in_flight = max_in_flight
+                        self.requeue_locked(job)
+                    return job
+            job = Job(uuid.uuid4().hex[:12], file_path, target_format, priority, max_in_flight, next(self.seq))
+            self.jobs[job.id] = job
+            self.append(job.to_record())
+            return job
+
+    def requeue(self, job_id):
+        """Queue a stopped, paused or cancelled job again"""
+        with self.lock:
+            job = self.jobs[job_id]
+            if not job.running:
+                self.requeue_locked(job)
+            return job
+
+    def requeue_locked(self, job):
+        # Tokens of a cancelled or stopped run are replaced, not reset, as old requests may still see them
+        job.cancel_event = threading.Event()
+        job.resume_event.set()
+        self.set_status_locked(job, "Queued")
+
+    def take(self, job_ids=None, admit=None):
+        """Mark the next queued job as processing and return it.
+
+        Returns None when nothing is queued, or when `admit` (called with the
+        next job) turns it down.
+        """
+        with self.lock:
+            queued = [job for job in self.jobs.values()
+                      if job.status == "Queued" and (job_ids is None or job.id in job_ids)]
+            if not queued:
+                return None
+            job = min(queued, key=lambda job: (-job.priority, job.seq))
+            if admit is not None and not admit(job):
+                return None
+            job.running = True
+            self.set_status_locked(job, "Processing")
+            return job
+
+    def finish(self, job_id, status):
+        with self.lock:
+            job = self.jobs[job_id]
+            job.running = False
+            self.set_status_locked(job, status)
+            return job
+
+    def pause(self, job_id):
+        """Hold back the chunks of a job; a queued job is not started until resumed"""
+        with self.lock:
+            job = self.jobs[job_id]
+            if job.status in ("Queued", "Processing"):
+                job.resume_event.clear()
+                self.set_status_locked(job, "Paused")
+            return job
+
+    def resume(self, job_id):
+        with self.lock:
+            job = self.jobs[job_id]
+            if job.status == "Paused":
+                job.resume_event.set()
+                self.set_status_locked(job, "Processing" if job.running else "Queued")
+            return job
+
+    def cancel(self, job_id):
+        """Cancel a job: a running one stops before its next chunk and cuts its requests in flight"""
+        with self.lock:
+            job = self.jobs[job_id]
+            if job.status in FINISHED:
+                return job
+            job.cancel_event.set()
+            job.resume_event.set()  # Held-back chunks are failed rather than kept waiting
+            self.set_status_locked(job, "Cancelling" if job.running else "Cancelled")
+            return job
+
+    def set_priority(self, job_id, priority):
+        with self.lock:
+            job = self.jobs[job_id]
+            job.priority = priority
+            self.append({"event": "priority", "id": job.id, "priority": priority})
+            return job
+
+    def remove(self, job_id):
+        """Forget a job that is not running"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.running:
+                return False
+            del self.jobs[job_id]
+            self.append({"event": "removed", "id": job_id})
+            return True
+
+    def queued_jobs(self, job_ids=None):
+        """Jobs waiting to be taken"""
+        with self.lock:
+            return [job for job in self.jobs.values()
+                    if job.status == "Queued" and (job_ids is None or job.id in job_ids)]
+
+    def running_jobs(self):
+        with self.lock:
+            return [job for job in self.jobs.values() if job.running]
+
+    def list(self):
+        """Every job in the queue, in the order they were added"""
+        with self.lock:
+            return sorted(self.jobs.values(), key=lambda job: job.seq)
+
+
+class SharedCancel:
+    """Cancellation token of a request shared by several jobs (a packed request).
+
+    It is set once the engine stops or every one of the jobs is cancelled;
+    like a threading.Event it can be waited on.
+    """
+
+    def __init__(self, stop_event, jobs, poll=0.1):
+        self.stop_event = stop_event
+        self.jobs = jobs
+        self.poll = poll
+
+    def is_set(self):
+        return self.stop_event.is_set() or all(job.cancelled for job in self.jobs)
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.is_set():
+            remaining = self.poll if deadline is None else min(self.poll, deadline - time.monotonic())
+            if remaining <= 0:
+                return False
+            self.stop_event.wait(remaining)
+        return True
+
+
+class Lane:
+    def __init__(self, job):
+        self.job = job
+        self.tasks = deque()
+        self.running = 0
+        self.last_turn = -1
+
+
+class JobExecutor:
+    """Executor-like view of a RequestScheduler that submits tasks on behalf of one job"""
+
+    def __init__(self, scheduler, job):
+        self.scheduler = scheduler
+        self.job = job
+
+    def submit(self, fn, *args, **kwargs):
+        return self.scheduler.submit(self.job, fn, *args, **kwargs)
+
+
+class RequestScheduler:
+    """Shared pool of request threads that serves jobs by priority, in turns and within their caps.
+
+    Every job has its own queue of tasks. A free thread runs the next task of
+    the highest-priority job that is not paused and has fewer than its
+    max_in_flight tasks running; jobs of equal priority take turns, so one
+    large document cannot hold every thread. Tasks of a cancelled job fail
+    with RequestCancelled without being run.
+    """
+
+    def __init__(self, max_workers, max_in_flight=None):
+        self.max_in_flight = max_in_flight
+        self.lanes = {}
+        self.turns = count()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.threads = [threading.Thread(target=self.work, daemon=True) for _ in range(max(1, max_workers))]
+        for thread in self.threads:
+            thread.start()
+
+    def for_job(self, job):
+        return JobExecutor(self, job)
+
+    def submit(self, job, fn, *args, **kwargs):
+        future = Future()
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            lane = self.lanes.get(job)
+            if lane is None:
+                lane = self.lanes[job] = Lane(job)
+            lane.tasks.append((future, fn, args, kwargs))
+            self.condition.notify()
+        return future
+
+    def wake(self):
+        """Re-check the lanes after a job was resumed, cancelled or changed priority"""
+        with self.condition:
+            self.condition.notify_all()
+
+    def next_lane(self):
+        # Called with the condition held
+        best = best_key = None
+        for job, lane in list(self.lanes.items()):
+            if not lane.tasks:
+                if not lane.running:
+                    del self.lanes[job]
+                continue
+            if job is None:
+                key = (0, lane.last_turn)
+            elif job.cancelled:
+                return lane
+            else:
+                cap = job.max_in_flight or self.max_in_flight
+                if job.paused or (cap and lane.running >= cap):
+                    continue
+                key = (-job.priority, lane.last_turn)
+            if best_key is None or key < best_key:
+                best, best_key = lane, key
+        return best
+
+    def work(self):
+        while True:
+            with self.condition:
+                lane = self.next_lane()
+                while lane is None:
+                    if self.closed:
+                        return
+                    self.condition.wait()
+                    lane = self.next_lane()
+                future, fn, args, kwargs = lane.tasks.popleft()
+                lane.running += 1
+                lane.last_turn = next(self.turns)
+
+            try:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                if lane.job is not None and lane.job.cancelled:
+                    future.set_exception(RequestCancelled(f"{Path(lane.job.file_path).name} was cancelled"))
+                    continue
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+            finally:
+                with self.condition:
+                    lane.running -= 1
+                    # A freed slot may let a capped job run again
+                    self.condition.notify()
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        with self.condition:
+            self.closed = True
+            if cancel_futures:
+                for lane in self.lanes.values():
+                    while lane.tasks:
+                        lane.tasks.popleft()[0].cancel()
+            self.condition.notify_all()
+        if wait:
+            for thread in self.threads:
+                thread.join()
@@ -0,0 +1,156 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+class Metrics:
+    """Per-job stage timings and counters.
+
+    Every observation is appended to a JSON lines file (when a path is set),
+    and summary() aggregates them for the end-of-job report. Stages are timed
+    with `with metrics.time("network"): ...`, counters with incr().
+    """
+
+    def __init__(self, path=None, prometheus_path=None):
+        self.path = Path(path) if path else None
+        self.prometheus_path = Path(prometheus_path) if prometheus_path else None
+        self.lock = threading.Lock()
+        self.file = None
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started_at = time.time()
+            self.durations = defaultdict(list)
+            self.counters = defaultdict(float)
+
+    def start_job(self, **fields):
+        self.reset()
+        if self.path:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.lock:
+                if self.file is None:
+                    self.file = open(self.path, "a", encoding="utf-8")
+        self.record("job_start", **fields)
+
+    def record(self, event, **fields):
+        if self.file is None:
+            return
+        line = json.dumps({"ts": round(time.time(), 3), "event": event, **fields}, default=str)
+        with self.lock:
+            if self.file is not None:
+                self.file.write(line + "\n")
+
+    def observe(self, stage, seconds, **labels):
+        with self.lock:
+            self.durations[stage].append(seconds)
+        self.record("stage", stage=stage, seconds=round(seconds, 4), **labels)
+
+    @contextmanager
+    def time(self, stage, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, **labels)
+
+    def incr(self, name, amount=1, **labels):
+        with self.lock:
+            self.counters[(name, label_key(labels))] += amount
+        self.record("counter", name=name, amount=amount, **labels)
+
+    def counter(self, name):
+        """Total of a counter over all label values"""
+        with self.lock:
+            return sum(value for (counter_name, _), value in self.counters.items() if counter_name == name)
+
+    def summary(self):
+        with self.lock:
+            elapsed = time.time() - self.started_at
+            stages = {
+                stage: {
+                    "count": len(values),
+                    "total_seconds": round(sum(values), 3),
+                    "mean_seconds": round(sum(values) / len(values), 4),
+                    "p50_seconds": round(percentile(values, 0.5), 4),
+                    "p99_seconds": round(percentile(values, 0.99), 4),
+                    "max_seconds": round(max(values), 4)
+                }
+                for stage, values in self.durations.items() if values
+            }
+            counters = defaultdict(dict)
+            for (name, labels), value in self.counters.items():
+                counters[name][",".join(f"{k}={v}" for k, v in labels) or "total"] = value
+
+        def total(name):
+            return sum(counters.get(name, {}).values())
+
+        chunks = total("chunks")
+        lookups = total("cache_hits") + total("cache_misses")
+        duplicates = total("duplicates")
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "chunks": chunks,
+            "chunks_per_second": round(chunks / elapsed, 3) if elapsed > 0 else 0.0,
+            "tokens_in": total("tokens_in"),
+            "tokens_out": total("tokens_out"),
+            "retries": total("retries"),
+            "rate_limited": dict(counters.get("rate_limited", {})),
+            "cache_hit_rate": round(total("cache_hits") / lookups, 3) if lookups else 0.0,
+            "records_written": total("records_written"),
+            "duplicates": duplicates,
+            "dedup_ratio": round(duplicates / (duplicates + total("records_written")), 3) if duplicates else 0.0,
+            "stages": stages,
+            "counters": dict(counters)
+        }
+
+    def finish_job(self):
+        """Write the job summary (and the Prometheus file if configured) and return it"""
+        summary = self.summary()
+        self.record("job_summary", **summary)
+        if self.prometheus_path:
+            self.write_prometheus(self.prometheus_path)
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+        return summary
+
+    def write_prometheus(self, path):
+        """Write the current metrics in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            counter_names = sorted({name for name, _ in self.counters})
+            for name in counter_names:
+                lines.append(f"# TYPE datagen_{name}_total counter")
+                for (counter_name, labels), value in sorted(self.counters.items()):
+                    if counter_name == name:
+                        label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                        lines.append(f"datagen_{name}_total{{{label_text}}} {value:g}" if label_text
+                                     else f"datagen_{name}_total {value:g}")
+            lines.append("# TYPE datagen_stage_seconds summary")
+            for stage, values in sorted(self.durations.items()):
+                for quantile in (0.5, 0.99):
+                    lines.append(f'datagen_stage_seconds{{stage="{stage}",quantile="{quantile}"}} {percentile(values, quantile):.6f}')
+                lines.append(f'datagen_stage_seconds_sum{{stage="{stage}"}} {sum(values):.6f}')
+                lines.append(f'datagen_stage_seconds_count{{stage="{stage}"}} {len(values)}')
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        tmp_path.replace(path)
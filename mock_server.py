@@ -0,0 +1,235 @@
+"""Local stand-in for the chat-completions API, used for offline runs and benchmarks.
+
+    python mock_server.py --port 8000 --latency 0.2 --rate-limit-rate 0.05
+
+Then point the converter at it with BACKENDS=MOCK and MOCK_BASE_URL=http://127.0.0.1:8000/v1.
+Requests with "stream": true are answered with server-sent events.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FORMAT_REQUEST = re.compile(r"into (.+?)\.(?:\s|$)")
+SECTION_LINE = re.compile(r"^(### SECTION \d+ \w+)$", re.MULTILINE)
+WORD = re.compile(r"[A-Za-z][A-Za-z'-]+")
+
+
+def excerpt(text, rng, words=12):
+    found = WORD.findall(text) or ["empty"]
+    start = rng.randrange(max(1, len(found) - words))
+    return " ".join(found[start:start + words])
+
+
+def canned_records(format_name, content, rng, count=2):
+    """Valid output for the requested format, built from words of the content"""
+    if format_name in ("CSV", "Table Format"):
+        rows = [f'{i},"{excerpt(content, rng)}",{len(content)}' for i in range(1, count + 1)]
+        return "\n".join(["id,excerpt,length"] + rows)
+
+    records = []
+    for _ in range(count):
+        first, second = excerpt(content, rng), excerpt(content, rng)
+        records.append({
+            "Alpaca Format": {"instruction": f"Explain: {first}", "input": "", "output": second},
+            "Prompt-Completion Format": {"prompt": first, "completion": second},
+            "Chat Format": {"messages": [{"role": "user", "content": first}, {"role": "assistant", "content": second}]},
+            "Q/A Format": {"question": f"What about {first}?", "answer": second},
+            "Instruction-Context-Response Format": {"instruction": f"Describe {first}", "context": first, "response": second},
+        }.get(format_name, {"text": first, "summary": second}))
+    return "\n".join(json.dumps(record) for record in records)
+
+
+class MockState:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "rate_limited": 0, "errors": 0, "streams_cancelled": 0}
+
+    def roll(self):
+        """Decide the outcome of a request: "rate_limited", "error" or "ok"."""
+        with self.lock:
+            self.counts["requests"] += 1
+            value = self.rng.random()
+            if value < self.args.rate_limit_rate:
+                self.counts["rate_limited"] += 1
+                return "rate_limited"
+            if value < self.args.rate_limit_rate + self.args.error_rate:
+                self.counts["errors"] += 1
+                return "error"
+            return "ok"
+
+    def delay(self):
+        with self.lock:
+            return max(0.0, self.rng.gauss(self.args.latency, self.args.jitter))
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def handle(self):
+        # Clients close idle keep-alive connections and cancel requests at any time, that is not an error
+        try:
+            super().handle()
+        except (ConnectionResetError, BrokenPipeError):
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        if self.server.state.args.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_event(self, body):
+        # One server-sent event per HTTP chunk, so clients see it as soon as it is written
+        data = f"data: {body if isinstance(body, str) else json.dumps(body)}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def send_stream(self, request, content, usage, duration, piece_chars=16):
+        """Stream the answer as chat.completion.chunk events spread over `duration` seconds"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        base = {"id": f"mock-{int(time.time() * 1000)}", "object": "chat.completion.chunk",
+                "model": request.get("model", "mock-model")}
+        pieces = [content[i:i + piece_chars] for i in range(0, len(content), piece_chars)]
+        try:
+            for piece in pieces:
+                self.send_event({**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+                time.sleep(duration / len(pieces))
+            self.send_event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if (request.get("stream_options") or {}).get("include_usage"):
+                self.send_event({**base, "choices": [], "usage": usage})
+            self.send_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the request
+            with self.server.state.lock:
+                self.server.state.counts["streams_cancelled"] += 1
+            self.close_connection = True
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self.send_json(200, {"data": [{"id": "mock-model", "object": "model"}]})
+        elif self.path.rstrip("/").endswith("/stats"):
+            self.send_json(200, self.server.state.counts)
+        else:
+            self.send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self.send_json(400, {"error": {"message": "Invalid JSON body"}})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": "Not found"}})
+            return
+
+        state = self.server.state
+        delay = state.delay()
+        streaming = bool(request.get("stream"))
+        # A streamed answer starts after part of the latency and trickles in over the rest
+        time.sleep(delay * 0.3 if streaming else delay)
+        outcome = state.roll()
+        if outcome == "rate_limited":
+            self.send_json(429, {"error": {"message": "Rate limit exceeded"}},
+                           {"Retry-After": str(state.args.retry_after)})
+            return
+        if outcome == "error":
+            self.send_json(500, {"error": {"message": "Injected server error"}})
+            return
+
+        messages = request.get("messages") or []
+        # The first user message holds the content; later ones are validation follow-ups
+        prompt = next((message.get("content", "") for message in messages if message.get("role") == "user"), "")
+        match = FORMAT_REQUEST.search(prompt)
+        format_name = match.group(1) if match else "JSONL"
+        with state.lock:
+            rng = random.Random(state.rng.random())
+
+        sections = SECTION_LINE.split(prompt)
+        if len(sections) > 1:
+            # Packed request: answer every section behind its own marker
+            parts = sections[1:]
+            content = "\n".join(
+                f"{marker}\n{canned_records(format_name, text, rng)}"
+                for marker, text in zip(parts[0::2], parts[1::2])
+            )
+        else:
+            content = canned_records(format_name, prompt, rng)
+        if state.args.preamble:
+            content = f"{state.args.preamble}\n\n{content}"
+
+        prompt_tokens = sum(len(message.get("content", "")) for message in messages) // 4
+        completion_tokens = len(content) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+        if streaming:
+            self.send_stream(request, content, usage, delay * 0.7)
+            return
+        self.send_json(200, {
+            "id": f"mock-{int(time.time() * 1000)}",
+            "object": "chat.completion",
+            "model": request.get("model", "mock-model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage
+        })
+
+
+def create_server(args):
+    server = ThreadingHTTPServer((args.host, args.port), MockHandler)
+    server.daemon_threads = True
+    server.state = MockState(args)
+    return server
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Mock chat-completions server for offline runs and benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mean response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Standard deviation of the latency")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--preamble", default="", help="Prose put before every answer, as chatty models do")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    server = create_server(args)
+    host, port = server.server_address[:2]
+    print(f"Mock chat-completions server listening on http://{host}:{port}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import csv
+import os
+
+from parsers import TABLE_FORMATS, dumps
+from plugins import writer_for
+
+
+class OutputSink:
+    """Appends the parsed records of each chunk to an output stream as soon as they are ready.
+
+    Chunks must be written in their original order. The stream is flushed
+    after every chunk and fsync'd every `sync_every` chunks and on close, so
+    partial outputs are usable while a job is still running. With a dedup
+    index, records already written to any output are dropped, except those
+    of other outputs of the same `origin` (an earlier conversion of the input).
+    """
+
+    def __init__(self, stream, sync_every=10, dedup=None, source=None):
+        self.stream = stream
+        self.sync_every = sync_every
+        self.dedup = dedup
+        self.source = source
+        self.origin = None
+        self.chunks_written = 0
+        self.records_written = 0
+        self.duplicates = {"exact": 0, "near": 0}
+
+    def keep(self, record):
+        """False when the dedup index has already seen this record or a near copy of it"""
+        if self.dedup is None:
+            return True
+        duplicate = self.dedup.check(record, self.source, self.origin)
+        if duplicate:
+            self.duplicates[duplicate] += 1
+        return duplicate is None
+
+    def write_chunk(self, records):
+        self.write_records(records)
+        self.chunks_written += 1
+        self.flush(sync=self.chunks_written % self.sync_every == 0)
+
+    def write_partial(self, records):
+        """Write the first records of a chunk that is still streaming in; write_chunk adds the rest"""
+        self.write_records(records)
+        self.flush()
+
+    def write_records(self, records):
+        raise NotImplementedError
+
+    def commit(self):
+        """Called once every chunk of the part has been written"""
+
+    def flush(self, sync=False):
+        self.stream.flush()
+        if self.dedup is not None:
+            self.dedup.commit()
+        if sync and hasattr(self.stream, "fileno"):
+            try:
+                os.fsync(self.stream.fileno())
+            except (OSError, ValueError):
+                pass
+
+    def close(self):
+        self.flush(sync=True)
+        self.stream.close()
+
+
+class TextSink(OutputSink):
+    """Plain text formats: chunks separated by a blank line"""
+
+    def write_records(self, records):
+        for text in records:
+            if not self.keep(text):
+                continue
+            if self.records_written:
+                self.stream.write("\n\n")
+            self.stream.write(text)
+            self.records_written += 1
+
+
+class JsonRecordSink(OutputSink):
+    """JSON formats: one validated record per line"""
+
+    def write_records(self, records):
+        for record in records:
+            if not self.keep(record):
+                continue
+            self.stream.write(dumps(record) + '\n')
+            self.records_written += 1
+
+
+class TableHeader:
+    """Header of a table output: the first row seen, with repeated copies dropped and rows padded to its width"""
+
+    def __init__(self):
+        self.header = None
+        self.header_key = None
+        self.rows_rejected = 0
+
+    def rows(self, rows):
+        """Yield the header (once) and then every data row that fits it"""
+        for row in rows:
+            key = [field.lower() for field in row]
+            if self.header is None:
+                self.header, self.header_key = row, key
+                yield row
+                continue
+            # Each chunk usually starts with its own copy of the header
+            if key == self.header_key:
+                continue
+            if len(row) > len(self.header):
+                self.rows_rejected += 1
+                continue
+            yield row + [''] * (len(self.header) - len(row))
+
+    def data_rows(self, rows):
+        first = self.header is None
+        for row in self.rows(rows):
+            if first:
+                first = False
+                continue
+            yield row
+
+
+class CsvSink(OutputSink):
+    """Header from the first row written, repeated headers dropped, rows padded to the header width"""
+
+    def __init__(self, stream, sync_every=10, dedup=None, source=None):
+        super().__init__(stream, sync_every, dedup, source)
+        self.writer = csv.writer(stream)
+        self.table = TableHeader()
+
+    def write_records(self, rows):
+        first = self.table.header is None
+        for row in self.table.rows(rows):
+            if first:
+                first = False
+                self.writer.writerow(row)
+                continue
+            if not self.keep(row):
+                continue
+            self.writer.writerow(row)
+            self.records_written += 1
+
+
+def create_sink(format_name, stream, sync_every=10, dedup=None, source=None):
+    """Sink of the writer registered for the format (see plugins.py)"""
+    return writer_for(format_name)(stream, sync_every, dedup, source)
+
+
+def open_sink(path, format_name, sync_every=10, dedup=None, origin=None):
+    """Open an output file for streaming writes in the given format, converted from `origin`"""
+    if dedup is not None:
+        # The file is rewritten from scratch, so its earlier records must not count as duplicates
+        dedup.forget(path)
+    newline = '' if format_name in TABLE_FORMATS else None
+    stream = open(path, 'w', encoding='utf-8', newline=newline)
+    sink = create_sink(format_name, stream, sync_every, dedup, source=path)
+    sink.origin = origin
+    return sink
@@ -0,0 +1,105 @@
+import re
+import threading
+import uuid
+from concurrent.futures import Future
+
+SECTION_MARKER = "### SECTION {} {}"
+PACK_INSTRUCTIONS = (
+    "The content is split into sections, each starting with a marker line such as `### SECTION 1 3f9a0c2e`. "
+    "Convert every section on its own and start its output with the same marker line, in the same order."
+)
+
+
+def new_tag():
+    """Random tag of the markers of one packed request, so content cannot be mistaken for a marker"""
+    return uuid.uuid4().hex[:8]
+
+
+def section_line(tag):
+    return re.compile(rf"^\W*SECTION\s+(\d+)\s+{tag}\W*$", re.MULTILINE | re.IGNORECASE)
+
+
+def pack_sections(chunks, tag):
+    """Join chunks into one prompt, each behind a numbered marker line carrying the tag"""
+    return "\n\n".join(f"{SECTION_MARKER.format(number, tag)}\n{chunk}" for number, chunk in enumerate(chunks, 1))
+
+
+def split_sections(text, count, tag):
+    """Split a packed response back into per-section texts (None where a section is missing).
+
+    A response with more or fewer markers than sections is not split at all.
+    """
+    sections = [None] * count
+    matches = list(section_line(tag).finditer(text))
+    if len(matches) != count:
+        return sections
+    for position, match in enumerate(matches):
+        number = int(match.group(1))
+        end = matches[position + 1].start() if position + 1 < len(matches) else len(text)
+        if 1 <= number <= count and sections[number - 1] is None:
+            sections[number - 1] = text[match.end():end].strip()
+    return sections
+
+
+class PendingBatch:
+    def __init__(self, executor):
+        self.executor = executor
+        self.items = []
+        self.tokens = 0
+        self.timer = None
+
+
+class ChunkPacker:
+    """Groups small chunks into batches that are sent as a single request.
+
+    Chunks with the same key (the target format) are collected until adding
+    one more would go over max_tokens or max_chunks, or until `linger`
+    seconds after the first one arrived. The batch is then handed to
+    `send_batch(items)` on the executor of its first chunk, which resolves
+    the future of every (item, future) pair.
+    """
+
+    def __init__(self, send_batch, max_tokens=1000, max_chunks=8, linger=0.2):
+        self.send_batch = send_batch
+        self.max_tokens = max_tokens
+        self.max_chunks = max_chunks
+        self.linger = linger
+        self.batches = {}
+        self.lock = threading.Lock()
+
+    def add(self, key, item, tokens, executor):
+        future = Future()
+        with self.lock:
+            batch = self.batches.get(key)
+            if batch is not None and batch.tokens + tokens > self.max_tokens:
+                self.flush_locked(key)
+                batch = None
+            if batch is None:
+                batch = PendingBatch(executor)
+                batch.timer = threading.Timer(self.linger, self.flush, args=(key, batch))
+                batch.timer.daemon = True
+                batch.timer.start()
+                self.batches[key] = batch
+            batch.items.append((item, future))
+            batch.tokens += tokens
+            if len(batch.items) >= self.max_chunks:
+                self.flush_locked(key)
+        return future
+
+    def flush(self, key, batch=None):
+        with self.lock:
+            if batch is None or self.batches.get(key) is batch:
+                self.flush_locked(key)
+
+    def flush_locked(self, key):
+        batch = self.batches.pop(key, None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        try:
+            batch.executor.submit(self.send_batch, batch.items)
+        except RuntimeError as e:
+            # The executor was shut down because the job failed or was stopped
+            for _, future in batch.items:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(e)
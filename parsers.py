@@ -0,0 +1,249 @@
+import csv
+import io
+import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_START = re.compile(r"[{\[]")
+FENCE_LINE = re.compile(r"^\s*```[\w-]*\s*$")
+CHAT_ROLES = {"system", "user", "assistant"}
+
+# Keys every record must have (non-empty strings) and optional string keys, per output format
+JSON_SCHEMAS = {
+    "Alpaca Format": {"required": ["instruction", "output"], "optional": ["input"]},
+    "Prompt-Completion Format": {"required": ["prompt", "completion"], "optional": []},
+    "Chat Format": {"required": ["messages"], "optional": []},
+    "Q/A Format": {"required": ["question", "answer"], "optional": []},
+    "Instruction-Context-Response Format": {"required": ["instruction", "response"], "optional": ["context"]},
+    "JSONL": {"required": ["text"], "optional": ["summary"]},
+}
+TABLE_FORMATS = ["CSV", "Table Format"]
+
+
+def loads(text):
+    """Parse JSON with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value).decode("utf-8")
+    return json.dumps(value, ensure_ascii=False)
+
+
+def extract_json_values(text):
+    """Find every JSON object in a response: one per line, pretty-printed, fenced or in arrays"""
+    values = []
+    leftover = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        # Fast path for the common one-object-per-line answer
+        if stripped.startswith("{") and stripped.endswith("}"):
+            try:
+                values.append(loads(stripped))
+                continue
+            except ValueError:
+                pass
+        if not FENCE_LINE.match(line):
+            leftover.append(line)
+
+    rest = "\n".join(leftover)
+    decoder = json.JSONDecoder()
+    position = 0
+    while True:
+        match = JSON_START.search(rest, position)
+        if not match:
+            break
+        try:
+            value, position = decoder.raw_decode(rest, match.start())
+            values.append(value)
+        except ValueError:
+            position = match.start() + 1
+
+    records = []
+    for value in values:
+        if isinstance(value, list):
+            records.extend(item for item in value if isinstance(item, dict))
+        elif isinstance(value, dict):
+            records.append(value)
+    return records
+
+
+class ParseResult:
+    def __init__(self, records, invalid=0):
+        self.records = records
+        self.invalid = invalid
+
+    @property
+    def ok(self):
+        return bool(self.records)
+
+
+class JsonRecordParser:
+    """Extracts records from a response and keeps the ones matching the format's schema"""
+
+    def __init__(self, format_name):
+        self.format_name = format_name
+        self.schema = JSON_SCHEMAS[format_name]
+
+    def parse(self, text):
+        records = []
+        invalid = 0
+        for value in extract_json_values(text):
+            record = self.validate(value)
+            if record is None:
+                invalid += 1
+            else:
+                records.append(record)
+        return ParseResult(records, invalid)
+
+    def validate(self, value):
+        # Models sometimes capitalize keys ("Question"), so match them case-insensitively
+        value = {str(key).strip().lower(): item for key, item in value.items()}
+        record = {}
+        for key in self.schema["required"]:
+            if key not in value:
+                return None
+            record[key] = value[key]
+        for key in self.schema["optional"]:
+            if key in value:
+                record[key] = value[key]
+
+        if self.format_name == "Chat Format":
+            messages = record["messages"]
+            if not isinstance(messages, list) or not messages:
+                return None
+            for message in messages:
+                if (not isinstance(message, dict) or message.get("role") not in CHAT_ROLES
+                        or not isinstance(message.get("content"), str)):
+                    return None
+            return record
+
+        for key, item in record.items():
+            if not isinstance(item, str):
+                record[key] = dumps(item) if isinstance(item, (dict, list)) else str(item)
+        if not all(record[key].strip() for key in self.schema["required"]):
+            return None
+        return record
+
+
+class CsvParser:
+    """Parses CSV answers with the csv module so quoted fields with commas survive.
+
+    The header is the first row of two or more columns followed by a row of the
+    same width; prose before it is dropped and so are later rows of another
+    width. A response without a header and a data row is not a table.
+    """
+
+    def rows(self, text):
+        lines = [line for line in text.splitlines() if line.strip() and not FENCE_LINE.match(line)]
+        return [
+            [field.strip() for field in row]
+            for row in csv.reader(io.StringIO("\n".join(lines)), skipinitialspace=True)
+            if any(field.strip() for field in row)
+        ]
+
+    def parse(self, text):
+        rows = self.rows(text)
+        for index, (row, next_row) in enumerate(zip(rows, rows[1:])):
+            if len(row) > 1 and len(next_row) == len(row):
+                table = [row] + [data for data in rows[index + 1:] if len(data) == len(row)]
+                return ParseResult(table, len(rows) - len(table))
+        return ParseResult([], len(rows))
+
+
+class TextParser:
+    def parse(self, text):
+        return ParseResult([text] if text.strip() else [])
+
+
+def create_parser(format_name):
+    if format_name in JSON_SCHEMAS:
+        return JsonRecordParser(format_name)
+    if format_name in TABLE_FORMATS:
+        return CsvParser()
+    return TextParser()
+
+
+class StreamingParser:
+    """Parses a response while it streams in, handing out records as soon as their line is complete.
+
+    Only whole lines are parsed on the fly (one JSON object, or one CSV row, per
+    line as the format instructions ask). finish() parses the full text with the
+    format's parser and keeps the records handed out so far at the front.
+    """
+
+    def __init__(self, format_name):
+        self.format_name = format_name
+        self.parser = create_parser(format_name)
+        self.buffer = ""
+        self.pending = []  # CSV lines of a row whose quoted field is still open
+        self.header = None
+        self.last_row = None
+        self.emitted = []
+
+    def feed(self, text):
+        """Add streamed text and return the records completed by it"""
+        self.buffer += text
+        *lines, self.buffer = self.buffer.split("\n")
+        records = []
+        for line in lines:
+            records.extend(self.parse_line(line))
+        self.emitted.extend(records)
+        return records
+
+    def parse_line(self, line):
+        if isinstance(self.parser, JsonRecordParser):
+            stripped = line.strip()
+            if not (stripped.startswith("{") and stripped.endswith("}")):
+                return []
+            try:
+                value = loads(stripped)
+            except ValueError:
+                return []
+            record = self.parser.validate(value) if isinstance(value, dict) else None
+            return [] if record is None else [record]
+        if isinstance(self.parser, CsvParser):
+            self.pending.append(line)
+            text = "\n".join(self.pending)
+            if text.count('"') % 2:
+                return []
+            self.pending = []
+            records = []
+            # Same header rule as CsvParser.parse, applied row by row
+            for row in self.parser.rows(text):
+                if self.header is not None:
+                    if len(row) == len(self.header):
+                        records.append(row)
+                elif self.last_row is not None and len(self.last_row) > 1 and len(row) == len(self.last_row):
+                    self.header = self.last_row
+                    records.extend([self.header, row])
+                else:
+                    self.last_row = row
+            return records
+        return []
+
+    def finish(self, text):
+        """Parse the complete response; records already handed out stay first and are not repeated"""
+        result = self.parser.parse(text)
+        count = len(self.emitted)
+        if result.records[:count] == self.emitted:
+            return result
+        records = self.emitted + [record for record in result.records if record not in self.emitted]
+        return ParseResult(records, result.invalid)
+
+
+def format_instructions(format_name):
+    """Output rules appended to the system message so responses parse on the first try"""
+    if format_name in JSON_SCHEMAS:
+        return "Respond only with JSON objects, one complete object per line, with no extra text or code fences."
+    if format_name in TABLE_FORMATS:
+        return ("Respond only with CSV: one header row followed by data rows, no extra text or code fences. "
+                "Quote fields that contain commas.")
+    return ""
@@ -0,0 +1,85 @@
+"""Registry of input readers and output writers, imported on first use.
+
+Entries name their implementation as "module:attribute", so heavy
+dependencies (PyMuPDF for PDFs, pandas for CSVs) are only imported once a
+file that needs them is processed. Extra modules listed in PLUGINS (comma
+separated) are imported on first lookup and can register their own entries:
+
+    from plugins import register_reader
+    register_reader([".docx"], "docx_reader:read_docx")
+
+A reader is called as reader(file_path, chunker, start, end, ocr_text) and
+returns (chunks, furniture_lines). A writer is an OutputSink class.
+"""
+import importlib
+import os
+import threading
+from pathlib import Path
+
+from parsers import JSON_SCHEMAS, TABLE_FORMATS
+
+DEFAULT = ""  # Key of the fallback entry
+
+READERS = {}
+WRITERS = {}
+loaded = {}
+lock = threading.Lock()
+plugins_imported = False
+
+
+def register_reader(extensions, target):
+    """Use `target` ("module:function") to read files with these extensions"""
+    for extension in extensions:
+        READERS[extension.lower()] = target
+
+
+def register_writer(format_names, target):
+    """Use `target` ("module:class") to write these output formats"""
+    for format_name in format_names:
+        WRITERS[format_name] = target
+
+
+def import_plugins():
+    global plugins_imported
+    with lock:
+        if plugins_imported:
+            return
+        plugins_imported = True
+    for name in os.getenv("PLUGINS", "").split(","):
+        if name.strip():
+            importlib.import_module(name.strip())
+
+
+def load(target):
+    """Import the module of a "module:attribute" entry (once) and return the attribute"""
+    implementation = loaded.get(target)
+    if implementation is None:
+        module_name, _, attribute = target.partition(":")
+        implementation = loaded[target] = getattr(importlib.import_module(module_name), attribute)
+    return implementation
+
+
+def reader_for(file_path):
+    import_plugins()
+    return load(READERS.get(Path(file_path).suffix.lower(), READERS[DEFAULT]))
+
+
+def writer_for(format_name):
+    import_plugins()
+    return load(WRITERS.get(format_name, WRITERS[DEFAULT]))
+
+
+def input_extensions():
+    """Extensions with a reader of their own, for file dialogs and help texts"""
+    import_plugins()
+    return sorted(extension for extension in READERS if extension != DEFAULT)
+
+
+register_reader([".pdf"], "extractors:read_pdf")
+register_reader([".csv"], "extractors:read_csv")
+register_reader([".json"], "extractors:read_json")
+register_reader([".txt", DEFAULT], "extractors:read_text")
+
+register_writer(JSON_SCHEMAS, "output_sinks:JsonRecordSink")
+register_writer(TABLE_FORMATS, "output_sinks:CsvSink")
+register_writer([DEFAULT], "output_sinks:TextSink")
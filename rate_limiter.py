@@ -0,0 +1,208 @@
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+class TokenBucket:
+    """Refilling bucket that allows `capacity` units per `period` seconds"""
+
+    def __init__(self, capacity, period=60.0):
+        self.capacity = float(capacity)
+        self.refill_rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self, now):
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
+            self.updated_at = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` units are available (0 if available now)"""
+        self.refill(now)
+        # Never ask for more than a full bucket, otherwise we would wait forever
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_rate
+
+    def consume(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def drain_until(self, reset_at, now):
+        """Empty the bucket so that it is full again at `reset_at`"""
+        self.tokens = min(self.tokens, -max(0.0, reset_at - now) * self.refill_rate + self.capacity)
+        self.updated_at = now
+
+
+class KeyState:
+    """Quota and health bookkeeping for a single API key"""
+
+    def __init__(self, index, requests_per_minute, tokens_per_minute):
+        self.index = index
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.blocked_until = 0.0
+        self.consecutive_rate_limits = 0
+        self.in_flight = 0
+
+    def wait_time(self, estimated_tokens, now):
+        wait = max(0.0, self.blocked_until - now)
+        if self.requests:
+            wait = max(wait, self.requests.wait_time(1, now))
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_time(estimated_tokens, now))
+        return wait
+
+
+def parse_duration(value):
+    """Parse header durations such as '12', '1.5', '6m0s', '250ms' or an HTTP date into seconds"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+        # Some providers send an absolute unix timestamp instead of a delay
+        if seconds > 1e9:
+            return max(0.0, seconds - time.time())
+        return max(0.0, seconds)
+    except ValueError:
+        pass
+
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if parts and "".join(number + unit for number, unit in parts) == value:
+        multipliers = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+        return sum(float(number) * multipliers[unit] for number, unit in parts)
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Schedules requests over API keys using per-key token buckets.
+
+    Each key has a requests/min and a tokens/min bucket. `acquire` hands out
+    the healthy key with the most headroom and only waits when every key is
+    out of quota. Keys that keep returning 429 are benched for a while so the
+    traffic goes to keys that still have quota.
+    """
+
+    def __init__(self, key_count, requests_per_minute=30, tokens_per_minute=100000,
+                 bench_after=2, bench_seconds=30.0, max_bench_seconds=600.0,
+                 base_backoff=1.0, max_backoff=30.0):
+        self.keys = [KeyState(i, requests_per_minute, tokens_per_minute) for i in range(key_count)]
+        self.bench_after = bench_after
+        self.bench_seconds = bench_seconds
+        self.max_bench_seconds = max_bench_seconds
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def estimate_tokens(messages, max_tokens):
+        # Roughly four characters per token for the prompt plus the completion budget
+        prompt_chars = sum(len(message.get("content", "")) for message in messages)
+        return prompt_chars // 4 + max_tokens
+
+    def acquire(self, estimated_tokens, cancel=None, deadline=None):
+        """Block until a key has quota, reserve it and return its index.
+
+        Returns None instead once `cancel` (a threading.Event) is set or the
+        `deadline` (a time.monotonic() value) passes without a free key.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                waits = [(key.wait_time(estimated_tokens, now), key.in_flight, key.index) for key in self.keys]
+                wait, _, index = min(waits)
+                if wait <= 0:
+                    key = self.keys[index]
+                    if key.requests:
+                        key.requests.consume(1)
+                    if key.tokens:
+                        key.tokens.consume(estimated_tokens)
+                    key.in_flight += 1
+                    return index
+            if deadline is not None:
+                if now >= deadline:
+                    return None
+                wait = min(wait, deadline - now)
+            if cancel is None:
+                time.sleep(min(wait, 1.0))
+            elif cancel.wait(min(wait, 1.0)):
+                return None
+
+    def wait_time(self, estimated_tokens):
+        """Seconds until some key has quota for a request, without reserving it"""
+        with self.lock:
+            now = time.monotonic()
+            return min((key.wait_time(estimated_tokens, now) for key in self.keys), default=0.0)
+
+    def release(self, index):
+        with self.lock:
+            self.keys[index].in_flight = max(0, self.keys[index].in_flight - 1)
+
+    def report_success(self, index, headers=None, estimated_tokens=None, used_tokens=None):
+        with self.lock:
+            key = self.keys[index]
+            key.in_flight = max(0, key.in_flight - 1)
+            key.consecutive_rate_limits = 0
+            # Give back the part of the reservation that was not actually used
+            if key.tokens and estimated_tokens and used_tokens is not None:
+                key.tokens.refund(max(0, estimated_tokens - used_tokens))
+            self.apply_headers(key, headers)
+
+    def report_rate_limited(self, index, headers=None):
+        """Record a 429 and return how long the key is unavailable"""
+        with self.lock:
+            now = time.monotonic()
+            key = self.keys[index]
+            key.in_flight = max(0, key.in_flight - 1)
+            key.consecutive_rate_limits += 1
+
+            retry_after = parse_duration((headers or {}).get("Retry-After"))
+            cooldown = retry_after if retry_after is not None else self.backoff_delay(key.consecutive_rate_limits)
+            if key.consecutive_rate_limits >= self.bench_after:
+                # Bench keys that keep failing, doubling the penalty each time
+                penalty = self.bench_seconds * 2 ** (key.consecutive_rate_limits - self.bench_after)
+                cooldown = max(cooldown, min(penalty, self.max_bench_seconds))
+
+            key.blocked_until = max(key.blocked_until, now + cooldown)
+            if key.requests:
+                key.requests.drain_until(key.blocked_until, now)
+            self.apply_headers(key, headers)
+            return cooldown
+
+    def apply_headers(self, key, headers):
+        """Sync the local buckets with the provider's rate-limit headers"""
+        if not headers:
+            return
+        now = time.monotonic()
+        for bucket, name in ((key.requests, "requests"), (key.tokens, "tokens")):
+            if bucket is None:
+                continue
+            remaining = headers.get(f"x-ratelimit-remaining-{name}")
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{name}"))
+            try:
+                remaining = float(remaining) if remaining is not None else None
+            except ValueError:
+                remaining = None
+            if remaining is not None and remaining < bucket.tokens:
+                bucket.tokens = remaining
+                bucket.updated_at = now
+            if remaining is not None and remaining <= 0 and reset is not None:
+                key.blocked_until = max(key.blocked_until, now + reset)
+
+    def backoff_delay(self, attempt):
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** max(0, attempt - 1)))
@@ -0,0 +1,272 @@
+import gzip
+import json
+import os
+import re
+import shutil
+import threading
+import uuid
+from pathlib import Path
+
+from output_sinks import OutputSink, TableHeader
+from parsers import TABLE_FORMATS, dumps
+
+MANIFEST_NAME = "manifest.jsonl"
+SHARD_NAME = re.compile(r"^shard-(\d+)\.jsonl(\.gz|\.zst)?$")
+EXTENSIONS = {"gzip": ".jsonl.gz", "zstd": ".jsonl.zst", "none": ".jsonl"}
+
+
+def resolve_compression(name):
+    """Return the compression actually available: zstd needs the zstandard package"""
+    name = (name or "gzip").lower()
+    if name == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            return "gzip"
+    return name if name in EXTENSIONS else "gzip"
+
+
+def compress(data, compression):
+    # Every chunk is its own gzip member / zstd frame, so it can be read from its offset alone
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    if compression == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return data
+
+
+def decompress(data, compression):
+    if compression == "gzip":
+        return gzip.decompress(data)
+    if compression == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+def compression_of(shard_name):
+    suffix = Path(shard_name).suffix
+    return {".gz": "gzip", ".zst": "zstd"}.get(suffix, "none")
+
+
+class ShardWriter:
+    """Appends records to size-bounded, compressed JSONL shards.
+
+    Each chunk's records are written as one compressed block, and a line in
+    manifest.jsonl maps it to its shard, byte offset and length, together with
+    the source file, part, page (or byte) range and chunk index. A part's
+    blocks only count once its "part" line is written, and when a part is
+    converted again its latest committed run replaces the earlier ones. A block
+    is fsync'd before its manifest line is written, and "part" lines right away.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, compression="gzip"):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.directory / MANIFEST_NAME
+        self.max_bytes = max_bytes
+        self.compression = resolve_compression(compression)
+        self.lock = threading.Lock()
+        self.file = None
+        self.path = None
+        self.size = 0
+        numbers = [int(match.group(1)) for match in map(SHARD_NAME.match, (p.name for p in self.directory.iterdir())) if match]
+        self.next_number = max(numbers, default=0) + 1
+
+    def open_part(self, part_key, format_name, source=None, part=None, span=None, unit=None,
+                  dedup=None, sync_every=10, origin=None):
+        """Sink that writes one part's records into the shards"""
+        if dedup is not None:
+            dedup.forget(self.dedup_source(part_key))
+        sink = ShardSink(self, part_key, format_name, source, part, span, unit, dedup, sync_every)
+        sink.origin = origin
+        return sink
+
+    def dedup_source(self, part_key):
+        # The manifest path keeps the entry alive in the dedup index while the shards exist
+        return f"{self.manifest_path}#{part_key}"
+
+    def roll(self):
+        """Start a new shard (called with the lock held)"""
+        if self.file is not None:
+            self.file.close()
+        self.path = self.directory / f"shard-{self.next_number:05d}{EXTENSIONS[self.compression]}"
+        self.next_number += 1
+        self.file = open(self.path, "ab")
+        self.size = self.file.tell()
+
+    def append(self, lines, entry):
+        block = compress("".join(line + "\n" for line in lines).encode("utf-8"), self.compression)
+        with self.lock:
+            if self.file is None or (self.size and self.size + len(block) > self.max_bytes):
+                self.roll()
+            offset = self.size
+            self.file.write(block)
+            self.file.flush()
+            # The manifest must never point at data that could still be lost
+            os.fsync(self.file.fileno())
+            self.size += len(block)
+            self.write_manifest({"event": "chunk", "shard": self.path.name, "offset": offset,
+                                 "length": len(block), "records": len(lines), **entry})
+        return self.path
+
+    def commit(self, part_key, run, runs=None):
+        """Commit a run of a part; `runs` keeps several runs, e.g. of the same part merged from several directories"""
+        entry = {"event": "part", "key": part_key, "run": run}
+        if runs:
+            entry["runs"] = runs
+        with self.lock:
+            self.write_manifest(entry, sync=True)
+
+    def write_manifest(self, entry, sync=False):
+        with open(self.manifest_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class ShardSink(OutputSink):
+    """Output sink for one part in shard mode; table rows become objects keyed by the header"""
+
+    def __init__(self, writer, part_key, format_name, source=None, part=None, span=None, unit=None,
+                 dedup=None, sync_every=10):
+        super().__init__(None, sync_every, dedup, writer.dedup_source(part_key))
+        self.writer = writer
+        self.part_key = part_key
+        self.run = uuid.uuid4().hex[:8]
+        self.table = TableHeader() if format_name in TABLE_FORMATS else None
+        self.entry = {"key": part_key, "run": self.run, "source": source, "part": part,
+                      "range": list(span) if span and span[0] is not None else None, "unit": unit}
+        self.path = writer.path
+        self.pending = []
+
+    def write_chunk(self, records):
+        # Records streamed in with write_partial are held back too, so every chunk is a single block
+        self.write_records(records)
+        if self.pending:
+            self.path = self.writer.append(self.pending, {**self.entry, "chunk": self.chunks_written})
+            self.pending = []
+        self.chunks_written += 1
+        self.flush(sync=self.chunks_written % self.sync_every == 0)
+
+    def write_records(self, records):
+        if self.table is not None:
+            records = [dict(zip(self.table.header, row)) for row in self.table.data_rows(records)]
+        lines = [dumps(record) for record in records if self.keep(record)]
+        self.records_written += len(lines)
+        self.pending.extend(lines)
+
+    def flush(self, sync=False):
+        if self.dedup is not None:
+            self.dedup.commit()
+
+    def commit(self):
+        self.writer.commit(self.part_key, self.run)
+
+    def close(self):
+        self.flush(sync=True)
+
+
+def read_manifest(directory):
+    """Chunk entries of the latest committed run(s) of every part, in the order they were written"""
+    manifest_path = Path(directory) / MANIFEST_NAME
+    if not manifest_path.exists():
+        return []
+    chunks = []
+    committed = {}
+    with open(manifest_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # Last line may be cut short by a crash
+            if entry.get("event") == "chunk":
+                chunks.append(entry)
+            elif entry.get("event") == "part":
+                committed[entry["key"]] = set(entry.get("runs") or [entry["run"]])
+    return [entry for entry in chunks if entry["run"] in committed.get(entry["key"], ())]
+
+
+def iter_shard_blocks(directory):
+    """Yield (manifest entry, records) for every committed block in a shard directory"""
+    directory = Path(directory)
+    handles = {}
+    try:
+        for entry in read_manifest(directory):
+            handle = handles.get(entry["shard"])
+            if handle is None:
+                handle = handles[entry["shard"]] = open(directory / entry["shard"], "rb")
+            handle.seek(entry["offset"])
+            data = decompress(handle.read(entry["length"]), compression_of(entry["shard"]))
+            yield entry, [json.loads(line) for line in data.decode("utf-8").splitlines() if line]
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+
+def iter_shard_records(directory):
+    """Yield every committed record of a shard directory"""
+    for _, records in iter_shard_blocks(directory):
+        yield from records
+
+
+def compact_shards(inputs, output, max_bytes=256 * 1024 * 1024, compression="gzip", block_bytes=1024 * 1024):
+    """Merge the committed records of one or more shard directories into fresh shards.
+
+    Superseded runs and blocks of unfinished parts are dropped, deciding per
+    input directory, so a part converted into several of them is kept from each. Consecutive
+    blocks of a part are merged into blocks of about block_bytes (uncompressed);
+    their manifest line gives the first and last chunk they hold. The output may
+    be one of the inputs; its old shards are replaced once the new ones are written.
+    Returns the number of records written.
+    """
+    output = Path(output)
+    staging = output.parent / f".{output.name}.compacting"
+    if staging.exists():
+        shutil.rmtree(staging)
+    writer = ShardWriter(staging, max_bytes=max_bytes, compression=compression)
+    records = 0
+    runs = {}
+    lines, part_fields, fields, size = [], None, None, 0
+    try:
+        for directory in inputs:
+            for entry, block in iter_shard_blocks(directory):
+                entry_fields = {name: value for name, value in entry.items()
+                                if name not in ("event", "shard", "offset", "length", "records", "chunk", "last_chunk")}
+                if lines and (entry_fields != part_fields or size >= block_bytes):
+                    writer.append(lines, fields)
+                    lines, size = [], 0
+                if not lines:
+                    part_fields = entry_fields
+                    fields = dict(entry_fields, chunk=entry["chunk"])
+                fields["last_chunk"] = entry.get("last_chunk", entry["chunk"])
+                for record in block:
+                    lines.append(dumps(record))
+                    size += len(lines[-1]) + 1
+                # Runs read from the directories are all committed ones; dicts keep them in order, once
+                runs.setdefault(entry["key"], {})[entry["run"]] = None
+                records += len(block)
+        if lines:
+            writer.append(lines, fields)
+        for part_key, part_runs in runs.items():
+            part_runs = list(part_runs)
+            writer.commit(part_key, part_runs[-1], part_runs if len(part_runs) > 1 else None)
+    finally:
+        writer.close()
+
+    output.mkdir(parents=True, exist_ok=True)
+    for path in output.iterdir():
+        if SHARD_NAME.match(path.name) or path.name == MANIFEST_NAME:
+            path.unlink()
+    for path in staging.iterdir():
+        shutil.move(str(path), str(output / path.name))
+    staging.rmdir()
+    return records
@@ -0,0 +1,72 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import mock_server  # noqa: E402
+from metrics import Metrics  # noqa: E402
+
+PARAGRAPHS = [
+    "Solar panels turn sunlight into electricity through the photovoltaic effect in their silicon cells.",
+    "Wind turbines capture the kinetic energy of moving air and drive a generator through a gearbox.",
+    "Hydroelectric dams store water in a reservoir and release it through turbines when power is needed.",
+    "Geothermal plants pump hot water from deep wells and use its steam to spin turbines on the surface.",
+]
+
+
+@pytest.fixture
+def mock_api(monkeypatch):
+    """The mock chat-completions server on a free port, configured as the only backend"""
+    args = mock_server.build_parser().parse_args(["--port", "0", "--latency", "0.05", "--jitter", "0"])
+    server = mock_server.create_server(args)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    monkeypatch.setenv("BACKENDS", "MOCK")
+    monkeypatch.setenv("MOCK_BASE_URL", f"http://{host}:{port}/v1")
+    monkeypatch.setenv("MOCK_MODEL", "mock-model")
+    monkeypatch.setenv("MOCK_API_KEY", "test-key")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def make_engine(tmp_path, mock_api, monkeypatch):
+    """Build conversion engines that keep all their files under tmp_path"""
+    from engine import ConversionEngine
+
+    # Small chunks, so every test file is split into several of them
+    monkeypatch.setenv("CHUNK_MAX_TOKENS", "40")
+    monkeypatch.setenv("OCR", "0")
+    engines = []
+
+    def make(**kwargs):
+        engine = ConversionEngine(
+            converted_dir=tmp_path / "out", remaining_dir=tmp_path / "remaining", cache_dir=tmp_path / "cache",
+            metrics=Metrics(), **kwargs
+        )
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.router.close()
+
+
+@pytest.fixture
+def write_text(tmp_path):
+    """Write a text input file made of the test paragraphs"""
+    def write(name, paragraphs=PARAGRAPHS):
+        path = tmp_path / name
+        path.write_text("\n\n".join(paragraphs) + "\n", encoding="utf-8")
+        return str(path)
+    return write
+
+
+def outputs(tmp_path, stem):
+    return sorted((tmp_path / "out").glob(f"{stem}_*"))
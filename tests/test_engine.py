@@ -0,0 +1,82 @@
+import csv
+import threading
+import time
+
+from conftest import outputs
+
+
+def test_failed_file_does_not_mark_its_chunks_as_converted(mock_api, make_engine, write_text, tmp_path):
+    first = write_text("first.txt")
+    second = write_text("second.txt")
+    engine = make_engine()
+
+    mock_api.state.args.error_rate = 1.0
+    assert engine.process_files([first], "JSONL") == {first: "Failed"}
+
+    # The identical file is converted in full, not skipped as a repeat of the failed one
+    mock_api.state.args.error_rate = 0.0
+    assert engine.process_files([second], "JSONL") == {second: "Completed"}
+    [output] = outputs(tmp_path, "second")
+    assert output.read_text(encoding="utf-8").strip()
+
+
+def test_reconverting_the_same_input_keeps_its_records(mock_api, make_engine, write_text, tmp_path):
+    source = write_text("a.txt")
+    engine = make_engine()
+    assert engine.process_files([source], "JSONL") == {source: "Completed"}
+    assert engine.process_files([source], "JSONL") == {source: "Completed"}
+    for output in outputs(tmp_path, "a"):
+        assert output.read_text(encoding="utf-8").strip()
+
+
+def test_file_without_new_records_is_skipped(mock_api, make_engine, write_text, tmp_path):
+    first = write_text("first.txt")
+    engine = make_engine()
+    assert engine.process_files([first], "JSONL") == {first: "Completed"}
+    # Same content under another name: nothing new comes out of it
+    second = write_text("second.txt")
+    assert engine.process_files([second], "JSONL") == {second: "Skipped"}
+    assert outputs(tmp_path, "second") == []
+
+
+def test_csv_preamble_is_not_taken_for_the_header(mock_api, make_engine, write_text, tmp_path, monkeypatch):
+    # Each chunk on its own request, so every answer starts with the preamble
+    monkeypatch.setenv("PACK_CHUNKS", "0")
+    mock_api.state.args.preamble = "Here is the table:"
+    source = write_text("a.txt")
+    engine = make_engine()
+    assert engine.process_files([source], "CSV") == {source: "Completed"}
+    [output] = outputs(tmp_path, "a")
+    header, *rows = list(csv.reader(output.open(encoding="utf-8", newline="")))
+    assert header == ["id", "excerpt", "length"]
+    assert rows and all(len(row) == 3 for row in rows)
+
+
+def test_stop_does_not_wait_for_benched_keys(mock_api, make_engine, write_text):
+    mock_api.state.args.rate_limit_rate = 1.0
+    mock_api.state.args.retry_after = 600
+    source = write_text("a.txt")
+    engine = make_engine()
+    results = {}
+    thread = threading.Thread(target=lambda: results.update(engine.process_files([source], "JSONL")))
+    thread.start()
+    time.sleep(1)
+    stopped = time.monotonic()
+    engine.stop()
+    thread.join(10)
+    assert not thread.is_alive()
+    assert time.monotonic() - stopped < 5
+    assert results == {source: "Stopped"}
+
+
+def test_unstreamed_answers_are_cut_off_at_the_chunk_deadline(mock_api, make_engine, write_text, monkeypatch):
+    monkeypatch.setenv("STREAM_RESPONSES", "0")
+    monkeypatch.setenv("PACK_CHUNKS", "0")
+    monkeypatch.setenv("CHUNK_DEADLINE_SECONDS", "1")
+    mock_api.state.args.latency = 30
+    source = write_text("a.txt")
+    engine = make_engine()
+    started = time.monotonic()
+    # Chunks without an answer in time are left to be retried by a later run
+    assert engine.process_files([source], "JSONL") == {source: "Failed"}
+    assert time.monotonic() - started < 15
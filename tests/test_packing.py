@@ -0,0 +1,12 @@
+from packing import pack_sections, split_sections
+
+
+def test_sections_are_split_on_their_tagged_markers():
+    prompt = pack_sections(["first", "second"], "3f9a0c2e")
+    answer = prompt.replace("first", "Section 2\nSECTION 1\none").replace("second", "two")
+    assert split_sections(answer, 2, "3f9a0c2e") == ["Section 2\nSECTION 1\none", "two"]
+
+
+def test_answer_with_a_missing_marker_is_not_split():
+    answer = "### SECTION 1 3f9a0c2e\none\ntwo"
+    assert split_sections(answer, 2, "3f9a0c2e") == [None, None]